@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+# Measure how long it takes to generate every floor of a tower, painting the
+# floors in the background thread as usual, and painting them in a pool of
+# processes with `GameWorld(paint_processes=N)`. The pool only pays for
+# starting its processes and shipping the floors back when there are spare
+# CPUs to paint on.
+
+import argparse
+import copy
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import entity_factories
+import main
+from engine import Engine
+from game_world import GameWorld
+
+
+def time_tower(shape, floors, processes, seed):
+    """Generate a whole tower, and return the time that took."""
+    start = time.perf_counter()
+    engine = Engine(
+        player=copy.deepcopy(entity_factories.player),
+        rng=np.random.default_rng(seed),
+    )
+    engine.game_world = GameWorld(
+        engine=engine,
+        map_shape=shape,
+        tower_floors=floors,
+        paint_processes=processes,
+    )
+    for i in range(floors):
+        engine.game_world.floor(i)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "-s",
+        "--seed",
+        help="specify random generator seed",
+        type=int,
+        default=0,
+    )
+    argparser.add_argument(
+        "-x",
+        "--width",
+        help="floor width",
+        type=int,
+        default=50,
+    )
+    argparser.add_argument(
+        "-y",
+        "--height",
+        help="floor height",
+        type=int,
+        default=50,
+    )
+    argparser.add_argument(
+        "--floors",
+        help="number of floors in the tower",
+        type=int,
+        default=10,
+    )
+    argparser.add_argument(
+        "--processes",
+        help="pool sizes to measure; 0 paints in the background thread",
+        type=int,
+        nargs="+",
+        default=[0, os.cpu_count() or 1],
+    )
+    args = argparser.parse_args()
+
+    main.load_tiles()
+    print(f"{os.cpu_count()} CPUs, {args.floors} floors "
+          f"of {args.width}x{args.height}")
+    print(f"{'processes':>9} {'tower':>10}")
+    for processes in args.processes:
+        elapsed = time_tower(
+            (args.width, args.height), args.floors, processes, args.seed
+        )
+        print(f"{processes:>9} {elapsed:>9.4f}s")
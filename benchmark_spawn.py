@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+# Measure how quickly entities can be spawned from their prototypes, comparing
+# `Entity.clone`, which copies only the state that changes during play,
+# against `copy.deepcopy` of the whole prototype.
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+# The game's modules import each other from the src directory.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import entity_factories
+
+
+PROTOTYPES = {
+    "orc": entity_factories.orc,
+    "troll": entity_factories.troll,
+    "rat": entity_factories.rat,
+    "archer": entity_factories.archer,
+    "health_potion": entity_factories.health_potion,
+    "fireball_scroll": entity_factories.fireball_scroll,
+    "sword": entity_factories.sword,
+    "upward_stairs": entity_factories.upward_stairs,
+}
+
+
+def time_spawns(make, prototype, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        make(prototype)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "-n",
+        "--count",
+        help="entities to spawn from each prototype",
+        type=int,
+        default=20000,
+    )
+    args = argparser.parse_args()
+
+    print(f"{'prototype':>16} {'clone/s':>10} {'deepcopy/s':>10} {'speedup':>8}")
+    total_clone = total_deepcopy = 0.0
+    for name, prototype in PROTOTYPES.items():
+        cloned = time_spawns(type(prototype).clone, prototype, args.count)
+        deepcopied = time_spawns(copy.deepcopy, prototype, args.count)
+        total_clone += cloned
+        total_deepcopy += deepcopied
+        print(f"{name:>16} {args.count / cloned:>10.0f} "
+              f"{args.count / deepcopied:>10.0f} {deepcopied / cloned:>7.1f}x")
+    spawns = args.count * len(PROTOTYPES)
+    print(f"{'all':>16} {spawns / total_clone:>10.0f} "
+          f"{spawns / total_deepcopy:>10.0f} "
+          f"{total_deepcopy / total_clone:>7.1f}x")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+# Measure how the cost of finding the walls around every room scales with the
+# number of rooms, comparing the room-to-walls index of a generated level
+# against a scan over every wall in the map.
+
+import argparse
+import numpy as np
+import time
+import src.maze.create as create
+
+
+def time_level(size, box_size, rng):
+    """Generate a level, and return it with the time that took."""
+    start = time.perf_counter()
+    level = create.level(shape=(size, size), box_size=box_size, rng=rng)
+    return level, time.perf_counter() - start
+
+
+def time_indexed(level):
+    start = time.perf_counter()
+    for room in level.rooms:
+        for wall in level.walls_around(room.id):
+            pass
+    return time.perf_counter() - start
+
+
+def time_scan(level):
+    # This is how `walls_around` worked before the index existed.
+    start = time.perf_counter()
+    for room in level.rooms:
+        for wall in level.walls:
+            if wall.adjoins(room.id):
+                pass
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "-s",
+        "--seed",
+        help="specify random generator seed",
+        type=int,
+        default=0,
+    )
+    argparser.add_argument(
+        "--box_size",
+        help="base grid cell size",
+        type=int,
+        default=8,
+    )
+    argparser.add_argument(
+        "--sizes",
+        help="map dimensions to measure",
+        type=int,
+        nargs="+",
+        default=[50, 100, 200, 300, 400],
+    )
+    args = argparser.parse_args()
+
+    print(f"{'size':>6} {'rooms':>6} {'walls':>6} "
+          f"{'indexed':>10} {'scan':>10} {'level':>10}")
+    for size in args.sizes:
+        rng = np.random.default_rng(args.seed)
+        level, generated = time_level(size, np.uint(args.box_size), rng)
+        indexed = time_indexed(level)
+        scan = time_scan(level)
+        print(f"{size:>6} {len(level.rooms):>6} {len(level.walls):>6} "
+              f"{indexed:>9.4f}s {scan:>9.4f}s {generated:>9.4f}s")
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
 import argparse
+import concurrent.futures
+import json
 import numpy as np
+import os
 import time
 import src.maze.render as render
 import src.maze.create as create
@@ -74,10 +77,7 @@ def to_chars(maze, level: int):
 def print_maze(maze, level):
     text = to_chars(maze, level)
     for y in range(maze.shape[1]):
-        line = ""
-        for x in range(maze.shape[0]):
-            line += chr(text[x, y])
-        print(line)
+        print("".join(map(chr, text[:, y].tolist())))
 
 
 def print_tower(tower):
@@ -89,6 +89,69 @@ def print_tower(tower):
         print(line)
 
 
+def measure(job):
+    """Generate one level or tower and return its statistics as a dict."""
+    seed, shape, box_size, stories = job
+    rng = np.random.default_rng(seed)
+    stats = {}
+    start = time.perf_counter()
+    if stories:
+        mazes = create.tower(
+            shape=shape, box_size=box_size, stories=stories, rng=rng, stats=stats
+        )
+    else:
+        mazes = [create.level(shape=shape, box_size=box_size, rng=rng, stats=stats)]
+    record = {"seed": seed, "seconds": time.perf_counter() - start}
+    for stage in create.STAGES:
+        record[f"{stage}_seconds"] = stats.get(f"{stage}_seconds", 0.0)
+    if "lair_attempts" in stats:
+        record["lair_rejections"] = stats["lair_attempts"] - 1
+    record["rooms"] = sum(len(maze.rooms) for maze in mazes)
+    record["doors"] = sum(len(maze.doorways) for maze in mazes)
+    return record
+
+
+def summarize(records, seconds, processes):
+    """Throughput, plus the distribution of each measurement."""
+    summary = {
+        "summary": True,
+        "count": len(records),
+        "processes": processes,
+        "wall_seconds": seconds,
+        "per_second": len(records) / seconds,
+    }
+    for key in records[0]:
+        if key == "seed":
+            continue
+        values = np.array([r[key] for r in records], dtype=np.double)
+        p50, p90, p99 = np.percentile(values, [50, 90, 99]).tolist()
+        summary[key] = {
+            "mean": values.mean().item(),
+            "p50": p50,
+            "p90": p90,
+            "p99": p99,
+            "max": values.max().item(),
+        }
+    return summary
+
+
+def run_batch(count, first_seed, shape, box_size, stories, processes):
+    """Print a JSON line for each maze generated, then one summarizing them."""
+    jobs = [
+        (seed, shape, box_size, stories)
+        for seed in range(first_seed, first_seed + count)
+    ]
+    processes = processes or os.cpu_count() or 1
+    start = time.perf_counter()
+    records = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        for record in pool.map(measure, jobs):
+            print(json.dumps(record), flush=True)
+            records.append(record)
+    seconds = time.perf_counter() - start
+    print(json.dumps(summarize(records, seconds, processes)))
+
+
 if __name__ == '__main__':
     argparser = argparse.ArgumentParser()
     argparser.add_argument(
@@ -119,6 +182,24 @@ if __name__ == '__main__':
         help="number of levels for three-dimensional maze",
         type=int,
     )
+    argparser.add_argument(
+        "--at",
+        help="print the window at this location of an unbounded maze",
+        type=int,
+        nargs=2,
+        metavar=("LEFT", "TOP"),
+    )
+    argparser.add_argument(
+        "--batch",
+        help="generate this many mazes, from consecutive seeds, and print "
+        "their statistics as JSON lines instead of the mazes",
+        type=int,
+    )
+    argparser.add_argument(
+        "--processes",
+        help="number of worker processes for --batch",
+        type=int,
+    )
     args = argparser.parse_args()
 
     seed = args.seed if args.seed else np.int64(time.time_ns())
@@ -128,6 +209,17 @@ if __name__ == '__main__':
     height = args.height or np.uint(50)
     box_size = args.box_size or max(4, int((width+height)//16))
 
+    if args.batch:
+        run_batch(
+            count=args.batch,
+            first_seed=int(seed),
+            shape=(int(width), int(height)),
+            box_size=np.uint(box_size),
+            stories=args.stories and np.uint(args.stories),
+            processes=args.processes,
+        )
+        raise SystemExit()
+
     print(f"seed: {seed}; x,y=({width},{height}); box_size={box_size}")
     if args.stories:
         tower = create.tower(
@@ -137,11 +229,19 @@ if __name__ == '__main__':
             rng=rng
         )
         print_tower(tower)
+    elif args.at:
+        left, top = args.at
+        maze, _ = create.region(
+            window=(left, top, left + width, top + height),
+            seed=np.int64(seed),
+            box_size=box_size,
+        )
+        print_maze(maze, 1)
     else:
         maze = create.level(
             shape=(width, height),
             box_size=box_size,
             rng=rng
         )
-        print_maze(maze.tiles, 1)
+        print_maze(maze, 1)
 
@@ -163,7 +163,7 @@ class MovementAction(ActionWithDirection):
             # can't move outside the map
             self.entity.appearance.move(self.dx, self.dy)
             raise exceptions.Impossible("You can't walk outside the map.")
-        if not self.engine.game_map.tiles["walkable"][dest_x, dest_y]:
+        if not self.engine.game_map.tile(dest_x, dest_y)["walkable"]:
             # can't move into a non-walkable map tile
             self.entity.appearance.move(self.dx, self.dy)
             raise exceptions.Impossible("Sorry man, I don't think you walk there")
@@ -0,0 +1,190 @@
+"""
+A two dimensional array stored in square chunks, so a very large map only
+uses memory for the parts of it which hold something.
+
+A chunk which has never been written holds nothing but the array's fill
+value; rather than allocating it, every such chunk reads from one shared,
+read-only chunk of that value. Writing a window which leaves a chunk holding
+only the fill value frees it again.
+
+Indexing with a pair of integers reads or writes one element, as with a
+numpy array. Indexing with a pair of slices reads or writes a window of the
+array, which is copied out of, or into, the chunks it overlaps; the windows
+are ordinary numpy arrays, so code which works on a window of a map need not
+know how it is stored.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Tuple
+
+import numpy as np  # type: ignore
+
+CHUNK_SIZE = 64
+
+Rect = Tuple[int, int, int, int]
+
+
+@lru_cache(maxsize=None)
+def _blank_chunk(dtype: np.dtype, fill: bytes, size: int) -> np.ndarray:
+    value = np.frombuffer(fill, dtype=dtype)[0]
+    chunk = np.full((size, size), fill_value=value, dtype=dtype, order="F")
+    chunk.flags.writeable = False
+    return chunk
+
+
+class ChunkedArray:
+    shape: Tuple[int, int]
+    dtype: np.dtype
+    chunk_size: int
+    _fill: bytes
+    _chunks: Dict[Tuple[int, int], np.ndarray]
+
+    def __init__(
+        self,
+        shape: Tuple[int, int],
+        fill_value: Any,
+        dtype: Any = None,
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        fill = np.asarray(fill_value, dtype=dtype)
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.dtype = fill.dtype
+        self.chunk_size = chunk_size
+        self._fill = fill.tobytes()
+        self._chunks = {}
+
+    @property
+    def fill_value(self) -> Any:
+        return np.frombuffer(self._fill, dtype=self.dtype)[0]
+
+    @property
+    def nbytes(self) -> int:
+        """The memory used by the chunks which have been allocated."""
+        return sum(chunk.nbytes for chunk in self._chunks.values())
+
+    def _blank(self) -> np.ndarray:
+        return _blank_chunk(self.dtype, self._fill, self.chunk_size)
+
+    def resident(self) -> Iterator[Tuple[int, int]]:
+        """Iterate over the coordinates, in chunks, of the allocated chunks."""
+        yield from self._chunks
+
+    def clear(self) -> None:
+        """Set every element back to the fill value."""
+        self._chunks.clear()
+
+    def chunk_rect(self, left: int, top: int, right: int, bottom: int) -> Rect:
+        """
+        Return the smallest rectangle made of whole chunks which covers the
+        given one, clipped to the array.
+        """
+        size = self.chunk_size
+        width, height = self.shape
+        return (
+            max(left // size * size, 0),
+            max(top // size * size, 0),
+            min(-(-right // size) * size, width),
+            min(-(-bottom // size) * size, height),
+        )
+
+    def _chunks_over(self, rect: Rect):
+        # Yield each chunk overlapping the rectangle, with the slices of the
+        # chunk and of the rectangle where they overlap.
+        left, top, right, bottom = rect
+        size = self.chunk_size
+        for cx in range(left // size, -(-right // size)):
+            x0, x1 = max(left, cx * size), min(right, (cx+1) * size)
+            for cy in range(top // size, -(-bottom // size)):
+                y0, y1 = max(top, cy * size), min(bottom, (cy+1) * size)
+                inner = (
+                    slice(x0 - cx*size, x1 - cx*size),
+                    slice(y0 - cy*size, y1 - cy*size),
+                )
+                outer = (slice(x0 - left, x1 - left), slice(y0 - top, y1 - top))
+                yield (cx, cy), inner, outer
+
+    def window(self, left: int, top: int, right: int, bottom: int) -> np.ndarray:
+        """Copy out a rectangle of the array."""
+        out = np.empty(
+            (right - left, bottom - top), dtype=self.dtype, order="F"
+        )
+        blank = self._blank()
+        for key, inner, outer in self._chunks_over((left, top, right, bottom)):
+            out[outer] = self._chunks.get(key, blank)[inner]
+        return out
+
+    def set_window(self, left: int, top: int, value: Any) -> None:
+        """Copy an array into the rectangle with this top left corner."""
+        value = np.asarray(value, dtype=self.dtype)
+        right, bottom = left + value.shape[0], top + value.shape[1]
+        fill = self.fill_value
+        for key, inner, outer in self._chunks_over((left, top, right, bottom)):
+            part = value[outer]
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                if np.all(part == fill):
+                    continue
+                chunk = self._chunks[key] = self._blank().copy(order="F")
+            chunk[inner] = part
+            if np.all(chunk == fill):
+                del self._chunks[key]
+
+    def _rect(self, key) -> Rect:
+        if key is Ellipsis:
+            key = (slice(None), slice(None))
+        elif isinstance(key, slice):
+            key = (key, slice(None))
+        xs, ys = key
+        x0, x1, xstep = xs.indices(self.shape[0])
+        y0, y1, ystep = ys.indices(self.shape[1])
+        if xstep != 1 or ystep != 1:
+            raise IndexError("chunked arrays do not support strided slices")
+        return x0, y0, max(x1, x0), max(y1, y0)
+
+    def _index(self, key) -> Tuple[Tuple[int, int], int, int]:
+        x, y = (int(i) for i in key)
+        width, height = self.shape
+        if x < 0:
+            x += width
+        if y < 0:
+            y += height
+        if not (0 <= x < width and 0 <= y < height):
+            raise IndexError(f"index {key} is out of bounds for {self.shape}")
+        size = self.chunk_size
+        return (x // size, y // size), x % size, y % size
+
+    @staticmethod
+    def _is_point(key) -> bool:
+        return (
+            isinstance(key, tuple)
+            and not any(isinstance(i, slice) or i is Ellipsis for i in key)
+        )
+
+    def __getitem__(self, key):
+        if self._is_point(key):
+            chunk_key, x, y = self._index(key)
+            return self._chunks.get(chunk_key, self._blank())[x, y]
+        return self.window(*self._rect(key))
+
+    def __setitem__(self, key, value):
+        if self._is_point(key):
+            chunk_key, x, y = self._index(key)
+            chunk = self._chunks.get(chunk_key)
+            if chunk is None:
+                if np.asarray(value, dtype=self.dtype) == self.fill_value:
+                    return
+                chunk = self._blank().copy(order="F")
+                self._chunks[chunk_key] = chunk
+            chunk[x, y] = value
+            return
+        left, top, right, bottom = self._rect(key)
+        value = np.asarray(value, dtype=self.dtype)
+        if value.ndim < 2:
+            value = np.broadcast_to(value, (right - left, bottom - top))
+        self.set_window(left, top, value)
+
+    def __array__(self, dtype=None, copy=None):
+        # The whole array at once: fine for small maps, costly for big ones.
+        out = self.window(0, 0, *self.shape)
+        return out if dtype is None else out.astype(dtype)
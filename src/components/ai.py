@@ -20,34 +20,50 @@ class BaseAI(Action):
     def perform(self) -> None:
         raise NotImplementedError()
 
+    def clone(self, entity: Actor) -> BaseAI:
+        """Return a copy of this AI to control another actor."""
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone.entity = entity
+        return clone
+
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         """Compute and return a path to the target position.
 
         If there is no valid path then returns an empty list.
         """
+        # Only search the chunks around the start and the destination.
+        gamemap = self.entity.gamemap
+        left, top, right, bottom = gamemap.active_rect(
+            self.entity.x, self.entity.y, to=(dest_x, dest_y)
+        )
         # Copy the walkable array.
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
+        view = (slice(left, right), slice(top, bottom))
+        cost = np.array(gamemap.layer("walkable", view), dtype=np.int8)
 
-        for entity in self.entity.gamemap.entities:
+        for entity in gamemap.entities:
+            x, y = entity.x - left, entity.y - top
+            if not (0 <= x < cost.shape[0] and 0 <= y < cost.shape[1]):
+                continue
             # Check that an entity blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
+            if entity.blocks_movement and cost[x, y]:
                 # Add to the cost of a blocked position.
                 # A lower number means more enemies will crowd behind each other in
                 # hallways.  A higher number means enemies will take longer paths in
                 # order to surround the player.
-                cost[entity.x, entity.y] += 10
+                cost[x, y] += 10
 
         # Create a graph from the cost array and pass that graph to a new pathfinder.
         graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
         pathfinder = tcod.path.Pathfinder(graph)
 
-        pathfinder.add_root((self.entity.x, self.entity.y))  # Start position.
+        pathfinder.add_root((self.entity.x - left, self.entity.y - top))  # Start position.
 
         # Compute the path to the destination and remove the starting point.
-        path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+        path: List[List[int]] = pathfinder.path_to((dest_x - left, dest_y - top))[1:].tolist()
 
         # Convert from List[List[int]] to List[Tuple[int, int]].
-        return [(index[0], index[1]) for index in path]
+        return [(index[0] + left, index[1] + top) for index in path]
 
 
 class ConfusedEnemy(BaseAI):
@@ -64,6 +80,12 @@ class ConfusedEnemy(BaseAI):
         self.previous_ai = previous_ai
         self.turns_remaining = turns_remaining
 
+    def clone(self, entity: Actor) -> ConfusedEnemy:
+        clone = super().clone(entity)
+        if self.previous_ai:
+            clone.previous_ai = self.previous_ai.clone(entity)
+        return clone
+
     def perform(self) -> None:
         # Revert the AI back to the original state if the effect has run its course.
         if self.turns_remaining <= 0:
@@ -107,6 +129,11 @@ class HostileEnemy(BaseAI):
         super().__init__(entity)
         self.path: List[Tuple[int, int]] = []
 
+    def clone(self, entity: Actor) -> BaseAI:
+        clone = super().clone(entity)
+        clone.path = list(self.path)
+        return clone
+
     def perform(self) -> None:
         target = self.engine.player
         dx = target.x - self.entity.x
@@ -131,6 +158,11 @@ class Epic_friend(BaseAI):
         super().__init__(entity)
         self.path: List[Tuple[int, int]] = []
 
+    def clone(self, entity: Actor) -> BaseAI:
+        clone = super().clone(entity)
+        clone.path = list(self.path)
+        return clone
+
     def perform(self) -> None:
 
         """for entity in self.entity.gamemap.entities:"""
@@ -158,6 +190,11 @@ class HostileArcher(BaseAI):
         self.path: List[Tuple[int, int]] = []
         self.readybow = 1
 
+    def clone(self, entity: Actor) -> BaseAI:
+        clone = super().clone(entity)
+        clone.path = list(self.path)
+        return clone
+
     def perform(self) -> None:
         target = self.engine.player
         dx = target.x - self.entity.x
@@ -18,6 +18,9 @@ class Default(Appearance):
     def __init__(self):
         pass
 
+    def clone(self) -> Default:
+        return self
+
 
 class Static(Appearance):
     def __init__(self, char, color=(255,255,255)):
@@ -26,6 +29,10 @@ class Static(Appearance):
     def render(self):
         return self.char, self.color
 
+    def clone(self) -> Static:
+        # Nothing changes a static appearance, so entities can share one.
+        return self
+
 
 class Directional(Appearance):
     """Pick left or right appearance depending on last horizontal motion."""
@@ -48,6 +55,13 @@ class Directional(Appearance):
     def render(self):
         return self.current.render()
 
+    def clone(self) -> Directional:
+        clone = super().clone()
+        clone.left = self.left.clone()
+        clone.right = self.right.clone()
+        clone.current = clone.left if self.current is self.left else clone.right
+        return clone
+
 
 class Looped(Appearance):
     """Cycle through a sequence of different appearances on each render."""
@@ -67,3 +81,8 @@ class Looped(Appearance):
     def render(self):
         return self.loop[self.pos].render()
 
+    def clone(self) -> Looped:
+        clone = super().clone()
+        clone.loop = [a.clone() for a in self.loop]
+        return clone
+
@@ -1,16 +1,28 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TypeVar, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
     from game_map import GameMap
 
+C = TypeVar("C", bound="BaseComponent")
+
 
 class BaseComponent:
     parent: Entity # owner
 
+    def clone(self: C) -> C:
+        """
+        Return a copy of this component for a new entity, which must set
+        its parent. The copy shares the attributes of this one, so a
+        component whose attributes change in place must copy them here.
+        """
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        return clone
+
     @property
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
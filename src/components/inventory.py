@@ -15,6 +15,15 @@ class Inventory(BaseComponent):
         self.capacity = capacity
         self.items: List[Item] = []
 
+    def clone(self) -> Inventory:
+        clone = super().clone()
+        clone.items = []
+        for item in self.items:
+            copied = item.clone()
+            copied.parent = clone
+            clone.items.append(copied)
+        return clone
+
     def drop(self, item: Item) -> None:
         """
         Removes an item from the inventory and restores it to the game map, at the player's current location.
@@ -35,12 +35,22 @@ class Engine:
 
     def save_as(self, filename: str) -> None:
         """Save this game engine instance as a compressed file."""
-        save_data = lzma.compress(pickle.dumps(self))
+        # Floors generated during the save could go missing from it, or
+        # refer to tiles which had not been saved yet.
+        with self.game_world.paused():
+            data = pickle.dumps(self)
+        save_data = lzma.compress(data)
         with open(filename, "wb") as f:
             f.write(save_data)
 
     def handle_enemy_turns(self) -> None:
+        # Enemies outside the chunks around the player stay where they are.
+        left, top, right, bottom = self.game_map.active_rect(
+            self.player.x, self.player.y
+        )
         for entity in set(self.game_map.actors) - {self.player}:
+            if not (left <= entity.x < right and top <= entity.y < bottom):
+                continue
             if entity.ai:
                 try:
                     entity.ai.perform()
@@ -49,23 +59,31 @@ class Engine:
 
     def update_fov(self) -> None:
         """Recompute the visible area based on the player's point of view."""
+        # Only the chunks around the player are considered; on a huge map,
+        # computing the field of view over the whole thing would be too slow.
+        game_map = self.game_map
+        left, top, right, bottom = game_map.active_rect(
+            self.player.x, self.player.y
+        )
+        view = (slice(left, right), slice(top, bottom))
         fov = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
+            game_map.layer("transparent", view),
+            (self.player.x - left, self.player.y - top),
             radius=0,
             algorithm=libtcodpy.FOV_SYMMETRIC_SHADOWCAST,
         )
         # If a tile is visible, add it to the "explored" map.
-        self.game_map.explored |= fov
+        game_map.explored[view] |= fov
         # Subtract walls along the bottom edge of the FOV from visibility.
         # Our quasi-isometric tile perspective shows the face of the wall
         # which belongs to the room below, not above: it doesn't make sense
         # to light up a wall the player cannot currently see.
         lower_edge = fov > np.roll(fov, shift=-1, axis=1)
-        walls = np.invert(self.game_map.tiles["walkable"])
+        walls = np.invert(game_map.layer("walkable", view))
         darken = np.logical_and(lower_edge, walls)
         viz = np.logical_and(fov, np.invert(darken))
-        self.game_map.visible[:] = viz
+        game_map.visible.clear()
+        game_map.visible[view] = viz
 
     def render(self, console: Console) -> None:
         self.game_map.render(console.rgb[:, :-7])
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import copy
 import math
 from typing import Optional, Tuple, TypeVar, TYPE_CHECKING, Union, Type
 
@@ -53,9 +52,21 @@ class Entity:
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    def clone(self: T) -> T:
+        """
+        Return a new entity like this one, with no parent. Names, stats and
+        static appearances are shared with this one; each component copies
+        only the state which changes as the game goes on.
+        """
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone.__dict__.pop("parent", None)
+        clone.appearance = self.appearance.clone()
+        return clone
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int) -> T:
         """Spawn a copy of this entity at the given location."""
-        clone = copy.deepcopy(self)
+        clone = self.clone()
         clone.x = x
         clone.y = y
         clone.parent = gamemap
@@ -122,6 +133,26 @@ class Actor(Entity):
         self.level = level
         self.level.parent = self
 
+    def clone(self) -> Actor:
+        clone = super().clone()
+        clone.ai = self.ai.clone(clone) if self.ai else None
+        clone.fighter = self.fighter.clone()
+        clone.inventory = self.inventory.clone()
+        clone.level = self.level.clone()
+        # Equipped items are the same objects as those in the inventory.
+        copies = {
+            id(item): copied
+            for item, copied in zip(self.inventory.items, clone.inventory.items)
+        }
+        clone.equipment = self.equipment.clone()
+        for slot in ("weapon", "armor"):
+            item = getattr(self.equipment, slot)
+            if item is not None:
+                setattr(clone.equipment, slot, copies.get(id(item)) or item.clone())
+        for component in (clone.fighter, clone.inventory, clone.level, clone.equipment):
+            component.parent = clone
+        return clone
+
     @property
     def is_alive(self) -> bool:
         """Returns True as long as this actor can perform actions."""
@@ -159,6 +190,16 @@ class Item(Entity):
         if self.equippable:
             self.equippable.parent = self
 
+    def clone(self) -> Item:
+        clone = super().clone()
+        if self.consumable:
+            clone.consumable = self.consumable.clone()
+            clone.consumable.parent = clone
+        if self.equippable:
+            clone.equippable = self.equippable.clone()
+            clone.equippable.parent = clone
+        return clone
+
 
 class Fixture(Entity):
     def __init__(
@@ -183,3 +224,10 @@ class Fixture(Entity):
         if self.mechanism:
             self.mechanism.parent = self
 
+    def clone(self) -> Fixture:
+        clone = super().clone()
+        if self.mechanism:
+            clone.mechanism = self.mechanism.clone()
+            clone.mechanism.parent = clone
+        return clone
+
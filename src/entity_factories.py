@@ -1,3 +1,9 @@
+"""
+Prototypes for every kind of entity in the game. The game never uses these
+directly: it spawns copies of them with `Entity.spawn`, or makes one with
+`Entity.clone`, which share each prototype's names, stats and static
+appearances and copy only the state which changes during play.
+"""
 from components.ai import HostileEnemy, Passive, Epic_friend, HostileArcher
 from components import consumable, equippable, mechanism
 from components.equipment import Equipment
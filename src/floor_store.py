@@ -0,0 +1,198 @@
+"""
+Keep the game maps for the floors of the tower within a memory budget.
+
+The floor the player is on, and the floors within reach of its stairs, stay
+in memory as they are. Once the rest take up more than the budget, the floors
+the player visited longest ago are pickled and compressed; asking for one of
+those floors again unpacks it.
+"""
+from __future__ import annotations
+
+import io
+import pickle
+import threading
+import zlib
+from typing import Dict, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from game_map import GameMap
+    from tile_palette import TilePalette
+
+# Rough memory cost of each entity on a map, on top of its tile arrays.
+ENTITY_BYTES = 2048
+
+
+def footprint(game_map: GameMap) -> int:
+    """Estimate how much memory this map uses."""
+    arrays = game_map.tiles.nbytes
+    arrays += game_map.visible.nbytes + game_map.explored.nbytes
+    return arrays + ENTITY_BYTES * len(game_map.entities)
+
+
+class _Pickler(pickle.Pickler):
+    # A map refers to the engine and the tile palette, and contains the
+    # player, which all belong to the whole game, so we pickle references to
+    # them instead of copies.
+    def __init__(self, file, engine: Engine, palette: Optional[TilePalette]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._engine = engine
+        self._palette = palette
+
+    def persistent_id(self, obj):
+        if obj is self._engine:
+            return "engine"
+        if obj is self._engine.player:
+            return "player"
+        if obj is self._palette and obj is not None:
+            return "palette"
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, engine: Engine, palette: Optional[TilePalette]):
+        super().__init__(file)
+        self._engine = engine
+        self._palette = palette
+
+    def persistent_load(self, pid):
+        if pid == "engine":
+            return self._engine
+        if pid == "player":
+            return self._engine.player
+        if pid == "palette":
+            return self._palette
+        raise pickle.UnpicklingError(f"unknown persistent id {pid!r}")
+
+
+class FloorStore:
+    """
+    Game maps by floor index. A floor is either missing, because it has not
+    been generated yet, hot, meaning its map is in memory, or cold, meaning
+    it is compressed.
+    """
+    engine: Engine
+    palette: Optional[TilePalette]
+    budget: int
+    keep_radius: int
+    evictions: int
+    restores: int
+    _hot: Dict[int, GameMap]
+    _cold: Dict[int, bytes]
+    _last_use: Dict[int, int]
+    _clock: int
+    _current: int
+
+    def __init__(
+        self,
+        engine: Engine,
+        budget: int,
+        keep_radius: int = 1,
+        palette: Optional[TilePalette] = None,
+    ):
+        self.engine = engine
+        # The palette the maps share, if they do.
+        self.palette = palette
+        # Hot floors beyond `keep_radius` of the current one may use this
+        # many bytes between them, as estimated by `footprint`.
+        self.budget = budget
+        self.keep_radius = keep_radius
+        self.evictions = 0
+        self.restores = 0
+        self._hot = {}
+        self._cold = {}
+        self._last_use = {}
+        self._clock = 0
+        self._current = 0
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        with self._lock:
+            state = self.__dict__.copy()
+            state["_hot"] = dict(self._hot)
+            state["_cold"] = dict(self._cold)
+            state["_last_use"] = dict(self._last_use)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def has(self, index: int) -> bool:
+        """Has this floor been generated?"""
+        return index in self._hot or index in self._cold
+
+    def get(self, index: int) -> Optional[GameMap]:
+        """Return this floor's map, unpacking it if necessary, or None if it
+        has not been generated."""
+        with self._lock:
+            if index in self._cold:
+                self._restore(index)
+            if index not in self._hot:
+                return None
+            self._touch(index)
+            return self._hot[index]
+
+    def put(self, index: int, game_map: GameMap):
+        """Store a newly generated floor."""
+        with self._lock:
+            assert not self.has(index)
+            self._hot[index] = game_map
+            self._touch(index)
+            self._evict()
+
+    def visit(self, index: int) -> GameMap:
+        """Return the map for the floor the player is moving to, which must
+        have been generated, and keep it and its neighbors in memory."""
+        with self._lock:
+            self._current = index
+            game_map = self.get(index)
+            assert game_map is not None
+            # Unpack the neighbors now, so taking the stairs again is quick.
+            radius = self.keep_radius
+            for i in range(index - radius, index + radius + 1):
+                if i in self._cold:
+                    self._restore(i)
+            self._evict()
+            return game_map
+
+    def stats(self) -> Dict[str, int]:
+        """Eviction metrics, and the current state of the store."""
+        with self._lock:
+            return {
+                "hot_floors": len(self._hot),
+                "cold_floors": len(self._cold),
+                "hot_bytes": sum(footprint(m) for m in self._hot.values()),
+                "cold_bytes": sum(len(b) for b in self._cold.values()),
+                "evictions": self.evictions,
+                "restores": self.restores,
+            }
+
+    def _touch(self, index: int):
+        self._clock += 1
+        self._last_use[index] = self._clock
+
+    def _evict(self):
+        # Compress the least recently used floors until the rest fit.
+        evictable = [
+            i for i in self._hot if abs(i - self._current) > self.keep_radius
+        ]
+        evictable.sort(key=lambda i: self._last_use[i])
+        used = sum(footprint(self._hot[i]) for i in evictable)
+        for index in evictable:
+            if used <= self.budget:
+                break
+            used -= footprint(self._hot[index])
+            self._compress(index)
+
+    def _compress(self, index: int):
+        buffer = io.BytesIO()
+        _Pickler(buffer, self.engine, self.palette).dump(self._hot.pop(index))
+        self._cold[index] = zlib.compress(buffer.getvalue())
+        self.evictions += 1
+
+    def _restore(self, index: int):
+        data = zlib.decompress(self._cold.pop(index))
+        self._hot[index] = _Unpickler(io.BytesIO(data), self.engine, self.palette).load()
+        self.restores += 1
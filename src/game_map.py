@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-from typing import Iterable, Iterator, Optional, Tuple, Any, TYPE_CHECKING
+from typing import Dict, Iterable, List, Iterator, Optional, Tuple, Any, TYPE_CHECKING
 from numpy.typing import NDArray
 import time
 import numpy as np  # type: ignore
 from tcod.console import Console
 
+from chunked_array import ChunkedArray, CHUNK_SIZE, Rect
 from entity import Actor, Item
+from tile_palette import TilePalette, index_dt
 import tile_types
 import graphics
 
@@ -16,6 +18,18 @@ if TYPE_CHECKING:
 
 
 class GameMap:
+    """
+    A floor of the dungeon: its tiles, what the player can see and has seen
+    of it, and the entities on it.
+
+    The tile, visibility and exploration layers are `ChunkedArray`s, which
+    only allocate memory for the parts of the map which have been painted,
+    seen, or explored. Per-turn work is confined to the chunks near the
+    player; see `active_rect`.
+
+    Each tile is stored as its index in the world's `TilePalette`; `tile`
+    and `layer` look up the tiles themselves.
+    """
     entry_location: Optional[Tuple[int, int]]
     exit_location: Optional[Tuple[int, int]]
     last_animate_time: float
@@ -23,14 +37,17 @@ class GameMap:
         self,
         engine: Engine,
         shape: Tuple[int, int],
-        entities: Iterable[Entity] = ()
+        entities: Iterable[Entity] = (),
+        palette: Optional[TilePalette] = None,
     ):
         self.engine = engine
         self.width, self.height = shape
         self.entities = set(entities)
-        self.tiles = np.full(shape, fill_value=tile_types.DEFAULT, order="F")
-        self.visible = np.full(shape, fill_value=False, order="F")
-        self.explored = np.full(shape, fill_value=False, order="F")
+        self.palette = palette if palette is not None else TilePalette()
+        # Palette index 0 is tile_types.DEFAULT.
+        self.tiles = ChunkedArray(shape, fill_value=0, dtype=index_dt)
+        self.visible = ChunkedArray(shape, fill_value=False)
+        self.explored = ChunkedArray(shape, fill_value=False)
         self.exit_location = (0, 0)
         self.entry_location = (0, 0)
         self.render_origin = (0, 0)
@@ -79,10 +96,53 @@ class GameMap:
         names = ", ".join(entity.name for entity in at_location)
         return names.capitalize()
 
+    def tile(self, x: int, y: int) -> np.void:
+        """Return the tile at this location."""
+        return self.palette.lookup(self.tiles[x, y])
+
+    def layer(
+        self,
+        name: str,
+        view: Tuple[slice, slice] = (slice(None), slice(None)),
+    ) -> NDArray[Any]:
+        """
+        Return one field of the tiles in a window of the map, such as
+        "walkable", "transparent", "light", or "dark", as a new array.
+        """
+        return self.palette.layer(name).take(self.tiles[view])
+
+    def set_tiles(self, tiles: NDArray[Any]) -> None:
+        """Replace every tile on the map with these."""
+        # Index them a chunk at a time, so only the chunks are full of indexes.
+        size = self.tiles.chunk_size
+        for left in range(0, self.width, size):
+            for top in range(0, self.height, size):
+                window = tiles[left:left + size, top:top + size]
+                self.tiles.set_window(left, top, self.palette.add(window))
+
     def in_bounds(self, x: int, y: int) -> bool:
         """Return True if x and y are inside of the bounds of this map."""
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def active_rect(
+        self, x: int, y: int, reach: int = CHUNK_SIZE,
+        to: Optional[Tuple[int, int]] = None,
+    ) -> Rect:
+        """
+        Return the (left, top, right, bottom) rectangle of whole chunks
+        within `reach` tiles of this location, or of the box spanning it and
+        location `to`. Work which need not cover the whole map, like field
+        of view and pathfinding, only looks inside this rectangle; on a map
+        no bigger than a few chunks, that is the entire map.
+        """
+        to_x, to_y = to if to else (x, y)
+        return self.tiles.chunk_rect(
+            min(x, to_x) - reach,
+            min(y, to_y) - reach,
+            max(x, to_x) + reach + 1,
+            max(y, to_y) + reach + 1,
+        )
+
     def translate_from_window(self, loc: Tuple[int, int]) -> Tuple[int, int]:
         """
         Given a coordinate in the display window, return the corresponding
@@ -162,7 +222,10 @@ class GameMap:
         view_explored = self.explored[views_horz, views_vert]
         style_tiles = np.select(
             condlist=[view_visible, view_explored],
-            choicelist=[view_tiles["light"], view_tiles["dark"]],
+            choicelist=[
+                self.palette.layer("light").take(view_tiles),
+                self.palette.layer("dark").take(view_tiles),
+            ],
             default=tile_types.SHROUD,
         )
 
@@ -194,7 +257,19 @@ class GameMap:
         # Draw the map contents.
         window[win_horz, win_vert] = style_tiles
 
-        # Draw visible entities in priority order on top of the rendered tiles.
+        # Draw visible entities in priority order on top of the rendered tiles,
+        # holding the glyphs made for the frame until all are drawn.
+        with graphics.holding():
+            self._render_entities(window, adjust_x, adjust_y)
+
+        # Save the map-relative coordinate for the origin point in the
+        # rendering window. This value can then be added to a position within
+        # the window to find out which map tile it represents.
+        self.render_origin = adjust_x, adjust_y
+
+    def _render_entities(
+        self, window: np.ndarray, adjust_x: int, adjust_y: int
+    ) -> None:
         entities_sorted_for_rendering = sorted(
             self.entities, key=lambda x: x.render_order.value
         )
@@ -203,6 +278,8 @@ class GameMap:
         do_animate_now = 0.25 <= (cur_animate_time - self.last_animate_time)
         if do_animate_now:
             self.last_animate_time = cur_animate_time
+        drawn: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        on_screen: List[int] = []
         for entity in entities_sorted_for_rendering:
             # Only render mobile entities which are currently visible; other
             # entities we'll draw if they have ever been explored.
@@ -222,11 +299,28 @@ class GameMap:
                 continue
             # composite the new tile onto the existing one
             bg_char = window[x, y][0]
-            new_char = graphics.composite(bg_char, char)
-            window[x, y][0] = new_char
+            # Entities sharing a tile stack up in order, so make the glyphs
+            # for all the others together before drawing this one.
+            if (x, y) in drawn:
+                on_screen += self._draw_composites(window, drawn)
+                bg_char = window[x, y][0]
+            drawn[x, y] = (bg_char, char)
+        on_screen += self._draw_composites(window, drawn)
+        # The screen shows these glyphs until the next frame replaces them.
+        graphics.hold_frame(on_screen)
 
-        # Save the map-relative coordinate for the origin point in the
-        # rendering window. This value can then be added to a position within
-        # the window to find out which map tile it represents.
-        self.render_origin = adjust_x, adjust_y
+    @staticmethod
+    def _draw_composites(
+        window: np.ndarray, drawn: Dict[Tuple[int, int], Tuple[int, int]]
+    ) -> List[int]:
+        # Draw each entity glyph over its background glyph, making any new
+        # glyphs in one batch, and return the glyphs drawn.
+        if not drawn:
+            return []
+        bg_chars, chars = zip(*drawn.values())
+        new_chars = graphics.composite_many(np.array(bg_chars), np.array(chars))
+        for (x, y), new_char in zip(drawn, new_chars.tolist()):
+            window[x, y][0] = new_char
+        drawn.clear()
+        return new_chars.tolist()
 
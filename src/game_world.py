@@ -1,9 +1,29 @@
-from typing import Tuple
+import concurrent.futures
+import contextlib
+import copy
+import multiprocessing
+import threading
+from typing import Callable, List, Optional, Tuple
 from engine import Engine
+from floor_store import FloorStore
+from game_map import GameMap
 import maze.create
-from procgen import generate_dungeon
+from maze.basemap import BaseMap
+from procgen import generate_dungeon, paint_symbolic
+from tile_palette import TilePalette
+from tower_cache import TowerCache
 import numpy as np
 
+# The main program may install a function which shows the player that the
+# game is waiting for a floor to finish generating; it receives the floor
+# number, counting from 1, and must return promptly.
+_loading_indicator: Optional[Callable[[int], None]] = None
+
+def set_loading_indicator(indicator: Optional[Callable[[int], None]]):
+    global _loading_indicator
+    _loading_indicator = indicator
+
+
 class GameWorld:
     """
     Contains all the state for the entire game.
@@ -11,6 +31,9 @@ class GameWorld:
     engine: Engine
     map_shape: Tuple[int, int]
     current_floor: int
+    base_tower: List[BaseMap]
+    tower: FloorStore
+    palette: TilePalette
 
     def __init__(
         self,
@@ -19,44 +42,224 @@ class GameWorld:
         map_shape: Tuple[int, int],
         tower_floors: int = 1,
         current_floor: int = 0,
+        paint_processes: int = 0,
+        seed: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        memory_budget: int = 32 * 2**20,
     ):
         self.engine = engine
         self.map_shape = map_shape
         self.tower_floors = tower_floors
         self.current_floor = current_floor
         box_size = np.uint(8)
-        base_tower = maze.create.tower(
-            shape=map_shape,
-            box_size=box_size,
-            stories=np.uint(tower_floors),
-            rng=engine.rng,
+        # If we know the seed, we may have generated this tower before.
+        self._cache = None
+        cached = None
+        if cache_dir is not None and seed is not None:
+            self._cache = TowerCache(
+                cache_dir,
+                seed=seed,
+                map_shape=map_shape,
+                tower_floors=tower_floors,
+                box_size=box_size,
+            )
+            cached = self._cache.load_tower()
+        if cached:
+            self.base_tower, engine.rng, self.floor_rngs = cached
+        else:
+            self.base_tower = maze.create.tower(
+                shape=map_shape,
+                box_size=box_size,
+                stories=np.uint(tower_floors),
+                rng=engine.rng,
+            )
+            # Painting and populating a floor is the expensive part, so we
+            # put it off until the player first arrives there. Each floor
+            # gets its own random generator, so it comes out the same
+            # whenever we generate it.
+            self.floor_rngs = engine.rng.spawn(len(self.base_tower))
+            if self._cache:
+                self._cache.save_tower(
+                    self.base_tower, engine.rng, self.floor_rngs
+                )
+        # All the floors keep their tiles in one palette.
+        self.palette = TilePalette()
+        # Floors away from the player get compressed to fit the budget.
+        self.tower = FloorStore(
+            engine, budget=memory_budget, palette=self.palette
         )
-        self.tower = [generate_dungeon(
-            base_map = base_map,
-            engine=self.engine,
-            floor=floor+1
-        ) for floor, base_map in enumerate(base_tower)]
+        # Optionally, paint the floors in parallel in a pool of processes;
+        # the worker thread then resolves their glyphs and populates them.
+        # Starting the pool costs more than it saves unless there are CPUs
+        # to spare; benchmark_paint.py measures both ways.
+        # Floors already in the cache need no painting.
+        self._pool = None
+        self._painting = None
+        if paint_processes:
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=paint_processes,
+                # Forking would copy our threads' locks, perhaps while held.
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._painting = [
+                None if self._cache and self._cache.has_floor(i)
+                else self._pool.submit(paint_symbolic, base_map, rng)
+                for i, (base_map, rng)
+                in enumerate(zip(self.base_tower, self.floor_rngs))
+            ]
+        self._start_worker()
+
+    def __getstate__(self):
+        # Wait for the worker to finish any floor it is generating, so we
+        # never save a floor's generator part way through making that floor.
+        # The generators are copied, since the worker goes on using them
+        # once we let go; the store saves its own snapshot of the floors.
+        # Pickle the whole game within `paused`, so the floors match the
+        # palette, which is pickled first.
+        with self._lock:
+            state = self.__dict__.copy()
+            state["floor_rngs"] = copy.deepcopy(self.floor_rngs)
+        # Unfinished paint jobs are dropped; those floors get painted again.
+        for name in ("_lock", "_worker", "_pool", "_painting"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        # The rest of the game is still being unpickled, so the worker must
+        # wait to start until the next time somebody asks for a floor.
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self._worker = None
+        self._pool = None
+        self._painting = None
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Keep the background worker from generating floors meanwhile; for
+        instance, while the game is being saved."""
+        with self._lock:
+            yield
+
+    def _start_worker(self):
+        # A background thread generates the floors the player has not reached
+        # yet, nearest first. The lock is held while generating any floor.
+        self._lock = threading.RLock()
+        self._worker = None
+        self._resume_worker()
+
+    def _resume_worker(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._work, daemon=True)
+            self._worker.start()
+
+    def _work(self):
+        while True:
+            if self._painting:
+                # Wait for paint jobs without the lock, so the player can
+                # still claim any floor which is ready meanwhile.
+                concurrent.futures.wait(
+                    [
+                        f for i, f in enumerate(self._painting)
+                        if f and not self.tower.has(i)
+                    ],
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+            with self._lock:
+                index = self._next_pending()
+                if index is None:
+                    break
+                self._generate(index)
+        if self._pool:
+            self._pool.shutdown(wait=False)
+
+    def _next_pending(self) -> Optional[int]:
+        # Choose the missing floor fewest stairways from the player's floor,
+        # preferring the one above when two are equally far.
+        here = max(self.current_floor-1, 0)
+        pending = [
+            i for i in range(len(self.base_tower)) if not self.tower.has(i)
+        ]
+        if not pending:
+            return None
+        if self._painting:
+            # Don't hold up the player for a floor which is still painting.
+            painted = [
+                i for i in pending
+                if not self._painting[i] or self._painting[i].done()
+            ]
+            pending = painted or pending
+        return min(pending, key=lambda i: (abs(i - here), i < here))
+
+    def _generate(self, index: int) -> GameMap:
+        game_map = self.tower.get(index)
+        if game_map is None:
+            # The dungeon generator thinks the game begins at level 1, but
+            # the tower generator returns an array, which begins at level 0.
+            rng = self.floor_rngs[index]
+            painted = None
+            if self._cache:
+                painted = self._cache.load_floor(index)
+            if not painted:
+                if self._painting and self._painting[index]:
+                    painted = self._painting[index].result()
+                elif self._cache:
+                    painted = paint_symbolic(self.base_tower[index], rng)
+                if painted and self._cache:
+                    self._cache.save_floor(index, *painted)
+            if painted:
+                tiles, recipes, rng = painted
+                painted = (tiles, recipes)
+            game_map = generate_dungeon(
+                base_map=self.base_tower[index],
+                engine=self.engine,
+                floor=index+1,
+                rng=rng,
+                painted=painted,
+                palette=self.palette,
+            )
+            self.tower.put(index, game_map)
+        return game_map
+
+    def floor(self, index: int) -> GameMap:
+        """Return the map for this floor, counting from 0, generating it if
+        the background worker has not got to it yet."""
+        self._resume_worker()
+        game_map = self.tower.get(index)
+        if game_map is None:
+            # The player has outrun the worker, so we have to wait.
+            if _loading_indicator:
+                _loading_indicator(index+1)
+            while not self._lock.acquire(timeout=0.1):
+                if _loading_indicator:
+                    _loading_indicator(index+1)
+            try:
+                game_map = self._generate(index)
+            finally:
+                self._lock.release()
+        return game_map
+
+    def _visit(self, index: int) -> GameMap:
+        # Make sure the floor exists, then move the store's focus to it.
+        self.floor(index)
+        return self.tower.visit(index)
 
     def go_to_starting_level(self) -> None:
-        game_map = self.tower[0]
+        game_map = self._visit(0)
         self.engine.game_map = game_map
         assert game_map.entry_location
         x, y = game_map.entry_location
-        tiles = game_map.tiles
-        assert not tiles[x,y]["walkable"]
-        if (y+1) < tiles.shape[1] and tiles[x,y+1]["walkable"]:
+        assert not game_map.tile(x, y)["walkable"]
+        if (y+1) < game_map.height and game_map.tile(x, y+1)["walkable"]:
             self.engine.player.place(x, y+1, game_map)
         else:
-            assert y > 0 and tiles[x,y-1]["walkable"]
+            assert y > 0 and game_map.tile(x, y-1)["walkable"]
             self.engine.player.place(x, y-1, game_map)
         self.current_floor = 1
 
     def go_to_next_level(self) -> None:
-        # The dungeon generator thinks the game begins at level 1, but the
-        # tower generator returns an array, which begins at level 0, and
-        # that's why we add 1 to the `floor` parameter instead of incrementing
-        # `current_floor` before calling `generate_dungeon`.
-        game_map = self.tower[self.current_floor]
+        # `current_floor` counts from 1, so it is already the index of the
+        # floor above.
+        game_map = self._visit(self.current_floor)
         self.engine.game_map = game_map
         assert game_map.entry_location
         x, y = game_map.entry_location
@@ -65,7 +268,7 @@ class GameWorld:
 
     def go_to_prev_level(self) -> None:
         self.current_floor -= 1
-        game_map = self.tower[self.current_floor-1]
+        game_map = self._visit(self.current_floor-1)
         self.engine.game_map = game_map
         assert game_map.exit_location
         x, y = game_map.exit_location
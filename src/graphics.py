@@ -1,8 +1,12 @@
 
+import contextlib
+import hashlib
+import os
+import threading
 import tcod
 from components import appearance
 from dataclasses import dataclass
-from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 import numpy as np
 
 """
@@ -11,7 +15,10 @@ Allocate a private-use codepoint for each graphic.
 Create appearances which govern the use and animation of these graphics.
 
 The main program must call `load_into`, passing in the tcod tileset. This will
-load all the graphics into the tileset under the allocated codepoints.
+load all the graphics into the tileset under the allocated codepoints. It may
+then call `load_atlas`, so glyphs made by combining others, such as a door on
+a floor, come from disk rather than being made again; `save_atlas` adds the
+new ones.
 
 Published codepoints are names in ALL_CAPS. Appearance objects are published
 using lower_case names.
@@ -19,16 +26,22 @@ using lower_case names.
 
 _tileset: tcod.tileset.Tileset
 
-# Basic multilingual plane private use area: 6400 code points
+# Basic multilingual plane private use area: 6400 code points, for the
+# glyphs loaded from the assets.
 PUA_BEGIN = 0xE000
 PUA_END = 0xF8FF
 
+# Floors may be generated on a background thread, so allocating a codepoint
+# and storing its tile must not interleave with another thread doing the same,
+# nor with the main loop presenting the tileset.
+tileset_lock = threading.RLock()
+
 _next_codepoint = PUA_BEGIN
 def _alloc():
     global _next_codepoint
-    ret = _next_codepoint
-    _next_codepoint += 1
-    # in future, switch from the BMP PUA to the plane 15 PUA
+    with tileset_lock:
+        ret = _next_codepoint
+        _next_codepoint += 1
     assert _next_codepoint <= PUA_END
     return ret
 
@@ -64,6 +77,11 @@ class TileGroup:
     def pick(self, **kwargs):
         return self._codes[self.index(**kwargs)]
 
+    @property
+    def codes(self) -> np.ndarray:
+        """All 16 codes, in the order `maze.render.larb_mask` indexes them."""
+        return np.array(self._codes)
+
     def flip_red_and_blue(self, tileset):
         """
         Recolor all of these tiles by swapping the red and blue channels.
@@ -169,43 +187,392 @@ amulet_of_yendor = appearance.Looped([
     appearance.Static(_AMULET_OF_YENDOR[1]),
 ])
 
-@lru_cache(maxsize=None)
+# Codepoints from here on are for glyphs made while the game runs.
+_loaded_end = _next_codepoint
+
 def composite(below: int, above: int):
     """Layer one tile on another to create a new tile."""
-    global _tileset
-    below_tile = _tileset.get_tile(below)
-    above_tile = _tileset.get_tile(above)
+    if _recipes() is not None:
+        return _record("composite", below, above)
+    return synthesize([("composite", below, above)])[0]
+
+def adjoin(left: int, right: int):
+    """Combine the left half of one tile with the right half of another."""
+    if _recipes() is not None:
+        return _record("adjoin", left, right)
+    return synthesize([("adjoin", left, right)])[0]
+
+def composite_many(below: np.ndarray, above: np.ndarray) -> np.ndarray:
+    """Array version of `composite`, making all the new tiles at once."""
+    below, above = np.broadcast_arrays(below, above)
+    pairs = list(zip(below.ravel().tolist(), above.ravel().tolist()))
+    if _recipes() is not None:
+        codes = [_record("composite", a, b) for a, b in pairs]
+    else:
+        codes = synthesize([("composite", a, b) for a, b in pairs])
+    return np.array(codes, dtype=np.int64).reshape(below.shape)
+
+def _composite_images(below: np.ndarray, above: np.ndarray) -> np.ndarray:
+    # Works on any number of tiles at once, stacked along the first axes.
     # Extract the RGB channels
-    srcRGB = above_tile[...,:3]
-    dstRGB = below_tile[...,:3]
+    srcRGB = above[...,:3]
+    dstRGB = below[...,:3]
     # Extract the alpha channels and normalise to range 0..1
-    srcA = above_tile[...,3]/255.0
-    dstA = below_tile[...,3]/255.0
+    srcA = above[...,3]/255.0
+    dstA = below[...,3]/255.0
     # Work out resultant alpha channel
     outA = srcA + dstA*(1-srcA)
     # Work out resultant RGB
-    outRGB = (srcRGB*srcA[...,np.newaxis] + dstRGB*dstA[...,np.newaxis]*(1-srcA[...,np.newaxis])) / outA[...,np.newaxis]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        outRGB = (srcRGB*srcA[...,np.newaxis] + dstRGB*dstA[...,np.newaxis]*(1-srcA[...,np.newaxis])) / outA[...,np.newaxis]
     # Merge RGB and alpha (scaled back up to 0..255) back into single image
-    outRGBA = np.dstack((outRGB,outA*255)).astype(np.uint8)
-    # Allocate a new codepoint and store the new tile image
-    out_code = _alloc()
-    _tileset.set_tile(out_code, outRGBA)
-    return out_code
+    return np.concatenate((outRGB, outA[...,np.newaxis]*255), axis=-1).astype(np.uint8)
+
+def _adjoin_images(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    assert left.shape == right.shape
+    out = np.zeros_like(left)
+    half_width = left.shape[-2] // 2
+    out[...,:half_width,:] = left[...,:half_width,:]
+    out[...,half_width:,:] = right[...,half_width:,:]
+    return out
+
+_MAKE_IMAGES = {"composite": _composite_images, "adjoin": _adjoin_images}
+
+# Glyphs made while the game runs get codepoints from the supplementary
+# private use areas, planes 15 and 16, which hold 131068 between them.
+MADE_RANGES = ((0xF0000, 0xFFFFD), (0x100000, 0x10FFFD))
+
+# Once there are more made glyphs than this, those no map uses are evicted,
+# least recently used first, and their codepoints are recycled. Glyphs in use
+# are never evicted, so there may be more than this for a while.
+GLYPH_LIMIT = 4096
+
+# The registry of made glyphs, all guarded by `tileset_lock`.
+# Every glyph made so far, by recipe, and the reverse.
+_made: Dict["Recipe", int] = {}
+_recipe_of: Dict[int, "Recipe"] = {}
+# The atlas key of each glyph made so far; see `_key`.
+_made_keys: Dict[int, str] = {}
+# How many users each glyph has: maps, through their palettes, and glyphs
+# made from it. Glyphs without users wait here, least recently used first.
+_refs: Dict[int, int] = {}
+_idle: Dict[int, None] = {}
+# Codepoints of evicted glyphs, to be handed out again.
+_free: List[int] = []
+_next_made = MADE_RANGES[0][0]
+
+def _alloc_made() -> int:
+    global _next_made
+    if _free:
+        return _free.pop()
+    ret = _next_made
+    if ret > MADE_RANGES[-1][1]:
+        raise RuntimeError("out of codepoints for made glyphs")
+    _next_made += 1
+    for (_, end), (begin, _) in zip(MADE_RANGES, MADE_RANGES[1:]):
+        if _next_made == end + 1:
+            _next_made = begin
+    return ret
 
-@lru_cache(maxsize=None)
-def adjoin(left: int, right: int):
-    """Combine the left half of one tile with the right half of another."""
-    global _tileset
-    left_tile = _tileset.get_tile(left)
-    right_tile = _tileset.get_tile(right)
-    assert left_tile.shape == right_tile.shape
-    outRGBA = np.zeros_like(left_tile)
-    half_width = left_tile.shape[0] // 2
-    outRGBA[::,:half_width,...] = left_tile[::,:half_width,...]
-    outRGBA[::,half_width:,...] = right_tile[::,half_width:,...]
-    out_code = _alloc()
-    _tileset.set_tile(out_code, outRGBA)
-    return out_code
+def retain(codes: Iterable[int]):
+    """Note a new user of each of these glyphs; loaded glyphs are ignored."""
+    with tileset_lock:
+        for code in codes:
+            if code in _recipe_of:
+                _refs[code] = _refs.get(code, 0) + 1
+                _idle.pop(code, None)
+
+def release(codes: Iterable[int]):
+    """Note that a user of each of these glyphs no longer needs it."""
+    with tileset_lock:
+        _release(codes)
+        _evict(0)
+
+def _release(codes: Iterable[int]):
+    # Only mark glyphs idle; the caller decides when to evict.
+    for code in codes:
+        if code in _refs:
+            _refs[code] -= 1
+            if not _refs[code]:
+                del _refs[code]
+                _idle[code] = None
+
+def _evict(room: int, keep: Iterable[int] = ()):
+    # Evict idle glyphs, other than those to keep, until there is room for
+    # this many more. Evicting a glyph may leave its ingredients idle, and
+    # they are considered in turn, but never those to keep.
+    keep = set(keep)
+    while len(_recipe_of) + room > GLYPH_LIMIT:
+        code = next((c for c in _idle if c not in keep), None)
+        if code is None:
+            break
+        del _idle[code]
+        recipe = _recipe_of.pop(code)
+        del _made[recipe], _made_keys[code]
+        _free.append(code)
+        _release(recipe[1:])
+
+def _touch(code: int):
+    if code in _idle:
+        del _idle[code]
+        _idle[code] = None
+
+# Glyphs made or reused within `holding` are kept until it ends.
+_holding = threading.local()
+
+@contextlib.contextmanager
+def holding():
+    """Keep the glyphs this thread makes or reuses within this context from
+    being evicted, until it ends; for instance, until a map has stored them."""
+    outer = getattr(_holding, "codes", None)
+    _holding.codes = []
+    try:
+        yield
+    finally:
+        held, _holding.codes = _holding.codes, outer
+        # An inner hold passes its glyphs on to the one around it.
+        if outer is not None:
+            outer.extend(held)
+        else:
+            release(held)
+
+# The glyphs drawn for the last frame, which stay on screen until the next.
+_on_screen: List[int] = []
+
+def hold_frame(codes: List[int]):
+    """Keep these glyphs, drawn for a frame, until the next frame's glyphs
+    take their place."""
+    global _on_screen
+    with tileset_lock:
+        retain(codes)
+        previous, _on_screen = _on_screen, list(codes)
+        release(previous)
+
+def _key(code: int) -> str:
+    # A made glyph's codepoint depends on what the session asked for first,
+    # so the atlas names it by its recipe instead, all the way down to the
+    # glyphs loaded from the assets, whose codepoints never change.
+    return _made_keys.get(code, str(code))
+
+def _recipe_key(op: str, a: int, b: int) -> str:
+    return f"{op[0]}({_key(a)},{_key(b)})"
+
+def synthesize(recipes: List["Recipe"]) -> List[int]:
+    """
+    Make the glyphs for these recipes, whose ingredients must all be real
+    codepoints, and return their codepoints.
+    Glyphs which have been made before are reused. The rest are blended
+    together, as one stack of images per operation, taken from the atlas
+    where it has them, and stored in the tileset all at once.
+    """
+    held = getattr(_holding, "codes", None)
+    codes: List[int] = []
+    with tileset_lock:
+        wanted = list(dict.fromkeys(r for r in recipes if r not in _made))
+        # Hold the ingredients, so they outlast the blending.
+        ingredients = [c for r in wanted for c in r[1:]]
+        retain(ingredients)
+    try:
+        keys = [_recipe_key(*r) for r in wanted]
+        images: List[Optional[np.ndarray]] = [_atlas.get(k) for k in keys]
+        for op, make_images in _MAKE_IMAGES.items():
+            todo = [
+                i for i, r in enumerate(wanted)
+                if r[0] == op and images[i] is None
+            ]
+            if not todo:
+                continue
+            tiles = {
+                code: _tileset.get_tile(code)
+                for code in {c for i in todo for c in wanted[i][1:]}
+            }
+            made = make_images(
+                np.stack([tiles[wanted[i][1]] for i in todo]),
+                np.stack([tiles[wanted[i][2]] for i in todo]),
+            )
+            for i, image in zip(todo, made):
+                images[i] = image
+        with tileset_lock:
+            _evict(len(wanted), keep=(_made[r] for r in recipes if r in _made))
+            for recipe, key, image in zip(wanted, keys, images):
+                # Another thread may have made it in the meantime.
+                if recipe not in _made:
+                    code = _alloc_made()
+                    _tileset.set_tile(code, image)
+                    _made[recipe] = code
+                    _recipe_of[code] = recipe
+                    _made_keys[code] = key
+                    _idle[code] = None
+                    # A glyph uses its ingredients.
+                    retain(recipe[1:])
+                    _remember(key, image)
+            codes = [_made[r] for r in recipes]
+            for code in codes:
+                _touch(code)
+            if held is not None:
+                retain(codes)
+                held.extend(codes)
+    finally:
+        # Evict only now, and never the glyphs being returned.
+        with tileset_lock:
+            _release(ingredients)
+            _evict(0, keep=codes)
+    return codes
+
+def describe(codes: np.ndarray) -> Tuple[np.ndarray, List["Recipe"]]:
+    """
+    The reverse of `resolve`: replace the made glyphs in this array of codes
+    with placeholders, and return it with the recipes they stand for, so the
+    glyphs can be made again in another session.
+    """
+    recipes: List[Recipe] = []
+    placeholders: Dict[int, int] = {}
+    def placeholder(code: int) -> int:
+        if code not in _recipe_of:
+            return code
+        if code not in placeholders:
+            op, a, b = _recipe_of[code]
+            recipes.append((op, placeholder(a), placeholder(b)))
+            placeholders[code] = -len(recipes)
+        return placeholders[code]
+    with tileset_lock:
+        distinct, inverse = np.unique(codes, return_inverse=True)
+        described = np.array(
+            [placeholder(int(c)) for c in distinct], dtype=codes.dtype
+        )
+    return described[inverse].reshape(codes.shape), recipes
+
+# A process which generates floors for the main process cannot touch the
+# tileset, so it records a recipe for each glyph it wants instead: either
+# ("composite", below, above) or ("adjoin", left, right). `composite` and
+# `adjoin` then return placeholder codes, counting down from -1, which stand
+# for the recipe with the same index; ingredients may be placeholders too.
+# The main process turns the recipes into codepoints with `resolve`.
+# Recording only affects the thread which asked for it.
+Recipe = Tuple[str, int, int]
+_recording = threading.local()
+
+def _recipes() -> Optional[List[Recipe]]:
+    return getattr(_recording, "recipes", None)
+
+def _record(*recipe):
+    code = _recording.codes.get(recipe)
+    if code is None:
+        _recording.recipes.append(recipe)
+        code = -len(_recording.recipes)
+        _recording.codes[recipe] = code
+    return code
+
+@contextlib.contextmanager
+def recording():
+    """Record glyph recipes, instead of making glyphs, within this context;
+    yields the list of recipes."""
+    _recording.recipes, _recording.codes = [], {}
+    try:
+        yield _recording.recipes
+    finally:
+        _recording.recipes, _recording.codes = None, {}
+
+def resolve(recipes: List[Recipe], codes: np.ndarray) -> np.ndarray:
+    """Make the glyphs for these recipes, then replace their placeholders in
+    this array of codes with the codepoints. Call within `holding` until
+    whatever needs the glyphs has retained them."""
+    with holding():
+        resolved = _resolve_all(recipes)
+    resolved = resolved.astype(codes.dtype)
+    return np.where(codes < 0, resolved[np.maximum(-codes, 0)], codes)
+
+def _resolve_all(recipes: List[Recipe]) -> np.ndarray:
+    resolved = np.zeros(len(recipes)+1, dtype=np.int64)
+    done = np.zeros(len(recipes)+1, dtype=bool)
+    done[0] = True
+    pending = list(range(len(recipes)))
+    # Synthesize in waves: each takes every recipe whose placeholder
+    # ingredients were made by the waves before.
+    while pending:
+        ready = [
+            i for i in pending
+            if all(c >= 0 or done[-c] for c in recipes[i][1:])
+        ]
+        assert ready, "recipes refer to each other in a cycle"
+        made = synthesize([
+            (recipes[i][0], *(
+                int(c if c >= 0 else resolved[-c]) for c in recipes[i][1:]
+            ))
+            for i in ready
+        ])
+        resolved[[i+1 for i in ready]] = made
+        done[[i+1 for i in ready]] = True
+        ready_set = set(ready)
+        pending = [i for i in pending if i not in ready_set]
+    return resolved
+
+# Made glyphs can be saved in an atlas on disk, so later sessions need only
+# store them in the tileset. An atlas file belongs to one version of the
+# assets: it is named for a hash of every asset file and of the codepoints
+# handed out to the loaded glyphs, which recipes refer to. It keeps the
+# ATLAS_LIMIT glyphs most recently made, oldest first.
+ATLAS_VERSION = 1
+ATLAS_LIMIT = GLYPH_LIMIT
+_atlas: Dict[str, np.ndarray] = {}
+_atlas_changed = False
+_atlas_path: Optional[str] = None
+
+def _remember(key: str, image: np.ndarray):
+    global _atlas_changed
+    if _atlas_path is None:
+        return
+    if key not in _atlas:
+        _atlas_changed = True
+    _atlas.pop(key, None)
+    _atlas[key] = image
+    while len(_atlas) > ATLAS_LIMIT:
+        del _atlas[next(iter(_atlas))]
+
+def _assets_digest(assets: str) -> str:
+    digest = hashlib.sha256(repr((ATLAS_VERSION, PUA_BEGIN, _loaded_end)).encode())
+    for root, dirs, files in os.walk(assets):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, assets).encode())
+            with open(path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()[:24]
+
+def load_atlas(directory: str, assets: str = "assets"):
+    """
+    Use the glyph atlas in this directory which matches the current assets,
+    if there is one. Call after `load_into`.
+    """
+    global _atlas_path, _atlas_changed
+    path = os.path.join(directory, f"glyphs-{_assets_digest(assets)}.npz")
+    with tileset_lock:
+        _atlas_path = path
+        _atlas.clear()
+        _atlas_changed = False
+        if os.path.exists(path):
+            with np.load(path) as archive:
+                _atlas.update(zip(archive["keys"].tolist(), archive["images"]))
+
+def save_atlas():
+    """Add the glyphs made since `load_atlas` to its atlas file."""
+    global _atlas_changed
+    with tileset_lock:
+        if _atlas_path is None or not _atlas_changed:
+            return
+        _atlas_changed = False
+        keys, images = list(_atlas), list(_atlas.values())
+    os.makedirs(os.path.dirname(_atlas_path) or ".", exist_ok=True)
+    # Write to a temporary file first, so a reader never sees half a file.
+    temp = f"{_atlas_path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        np.savez_compressed(
+            f,
+            keys=np.array(keys),
+            images=np.stack(images),
+        )
+    os.replace(temp, _atlas_path)
 
 def _set_mirrored(tileset, left_right, image):
     left, right = left_right
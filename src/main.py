@@ -5,6 +5,7 @@ import tcod.sdl.video
 import color
 import exceptions
 import setup_game
+import game_world
 import input_handlers
 from entity import Entity
 from random import randrange
@@ -17,6 +18,10 @@ def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
         handler.engine.save_as(filename)
         print("Game saved.")
 
+# Where made glyphs are kept between sessions; see `graphics.load_atlas`.
+GLYPH_CACHE = "glyph_cache"
+
+
 def load_tiles():
     # load the main font
     tileset = tcod.tileset.load_tilesheet(
@@ -43,6 +48,8 @@ def load_tiles():
 
     # Load all the game graphics, assigning them private-use characters.
     graphics.load_into(tileset)
+    # Reuse the glyphs earlier sessions made from them.
+    graphics.load_atlas(GLYPH_CACHE)
 
     return tileset
 
@@ -70,12 +77,24 @@ def main():
         # take over the whole screen - no window chrome
         if context.sdl_window:
             context.sdl_window.fullscreen = tcod.sdl.video.WindowFlags.FULLSCREEN_DESKTOP
+        # if the player reaches a floor before it has been generated, keep
+        # the window alive with a notice while they wait
+        def show_loading(floor: int) -> None:
+            root_console.clear()
+            notice = input_handlers.PopupMessage(
+                handler, f"Building floor {floor}..."
+            )
+            notice.on_render(console=root_console)
+            with graphics.tileset_lock:
+                context.present(root_console, integer_scaling=True)
+        game_world.set_loading_indicator(show_loading)
         # run the game loop forever
         try:
             while True:
                 root_console.clear()
                 handler.on_render(console=root_console)
-                context.present(root_console, integer_scaling=True)
+                with graphics.tileset_lock:
+                    context.present(root_console, integer_scaling=True)
 
                 try:
                     for event in tcod.event.wait(timeout=0.3):
@@ -98,6 +117,8 @@ def main():
         except BaseException:  # Save on any other unexpected exception.
             save_game(handler, "savegame.sav")
             raise
+        finally:
+            graphics.save_atlas()
 
 
 # python magic to call the main function when the program begins
@@ -1,29 +1,132 @@
 from __future__ import annotations
 
 import numpy as np
-from enum import Enum
+from collections import deque
+from enum import IntEnum
 from typing import Dict, Set, Tuple, List, Optional
 
-class Tile(Enum):
-    VOID = 0,
-    WALL = 1,
-    FLOOR = 2,
-    DOOR = 3,
-    DEBUG = 4,
+class Tile(IntEnum):
+    """Tile codes; maps store these as `TILE_DTYPE` integers, not objects."""
+    VOID = 0
+    WALL = 1
+    FLOOR = 2
+    DOOR = 3
+    DEBUG = 4
+
+# One byte per tile. Because `Tile` members are integers, comparisons such as
+# `tiles == Tile.WALL` are ordinary vectorized numpy operations.
+TILE_DTYPE = np.uint8
+
+# Plain integer names for the tile codes. Comparing a single tile against one
+# of these is much cheaper than comparing it against a `Tile` member.
+VOID, WALL, FLOOR, DOOR, DEBUG = (int(t) for t in Tile)
+
+
+class LabelGrid:
+    """
+    An integer label for every map tile, where zero means "unlabeled".
+    Tiles are grouped by label in a compressed sparse row index: `coords`
+    lists the (x, y) location of every labeled tile, sorted by label and then
+    in x-major order, and the tiles for label N are the slice between
+    `offsets[N]` and `offsets[N+1]`. The index is rebuilt on demand after the
+    labels change, and it is not saved, since it is derived data.
+    """
+    labels: np.ndarray
+    _offsets: Optional[np.ndarray]
+    _coords: Optional[np.ndarray]
+    def __init__(self, shape: Tuple[int, int]):
+        self.labels = np.zeros(shape, dtype=np.int32)
+        self._offsets = None
+        self._coords = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_offsets"] = None
+        state["_coords"] = None
+        return state
+
+    @property
+    def offsets(self) -> np.ndarray:
+        if self._offsets is None:
+            self._build_index()
+        return self._offsets
+
+    @property
+    def coords(self) -> np.ndarray:
+        if self._coords is None:
+            self._build_index()
+        return self._coords
+
+    def tiles(self, label: int) -> np.ndarray:
+        """Read-only (N, 2) view of the coordinates with this label."""
+        offsets = self.offsets
+        if label <= 0 or label+1 >= len(offsets):
+            return self.coords[0:0]
+        return self.coords[offsets[label]:offsets[label+1]]
+
+    def count(self, label: int) -> int:
+        offsets = self.offsets
+        if label <= 0 or label+1 >= len(offsets):
+            return 0
+        return int(offsets[label+1] - offsets[label])
+
+    def contains(self, x: int, y: int, label: int) -> bool:
+        return label != 0 and self.labels[x, y] == label
+
+    def bounds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Bounding box of every label, as two (L, 2) arrays indexed by label:
+        the minimum and the maximum (x, y) of that label's tiles. Labels with
+        no tiles get a minimum greater than their maximum.
+        """
+        offsets = self.offsets
+        coords = self.coords
+        present = np.flatnonzero(np.diff(offsets))
+        low = np.full((len(offsets)-1, 2), max(self.labels.shape), dtype=int)
+        high = np.full((len(offsets)-1, 2), -1, dtype=int)
+        if len(present):
+            # Each label's tiles are a contiguous run of `coords`, so one
+            # reduction per run finds its extremes.
+            starts = offsets[present]
+            low[present] = np.minimum.reduceat(coords, starts, axis=0)
+            high[present] = np.maximum.reduceat(coords, starts, axis=0)
+        return low, high
+
+    # Mutators
+    def place(self, x: int, y: int, label: int):
+        self.labels[x, y] = label
+        self._offsets = None
+        self._coords = None
+
+    def place_many(self, mask: np.ndarray, labels: np.ndarray):
+        self.labels[mask] = labels[mask]
+        self._offsets = None
+        self._coords = None
+
+    def _build_index(self):
+        flat = self.labels.ravel()
+        where = np.flatnonzero(flat)
+        found = flat[where]
+        order = np.argsort(found, kind="stable")
+        counts = np.bincount(found, minlength=1)
+        self._offsets = np.concatenate(([0], np.cumsum(counts)))
+        xs, ys = np.unravel_index(where[order], self.labels.shape)
+        self._coords = np.stack((xs, ys), axis=-1)
+        self._coords.flags.writeable = False
 
 
 class Room:
     """A game region consisting of a contiguous set of floor tiles."""
     """A room with ID 0 represents the void, which cannot contain anything."""
     id: int
-    _tiles: Set[Tuple[int, int]]
+    _labels: LabelGrid
     _neighbor_ids: Set[int]
     _connection_ids: Set[int]
     neighbors: Optional[Set[Room]]
     connections: Optional[Set[Room]]
-    def __init__(self, id: int):
+    def __init__(self, id: int, labels: LabelGrid):
         self.id = id
-        self._tiles = set()
+        self._labels = labels
         self._neighbor_ids = set()
         self._connection_ids = set()
         # Builder will populate these when creating the BaseMap.
@@ -32,10 +135,14 @@ class Room:
 
     # Public accessors
     def is_empty(self):
-        return 0 == len(self._tiles) if self.id else True
+        return 0 == self.area()
 
     def tiles(self):
-        return frozenset(self._tiles) if self.id else frozenset()
+        """Read-only (N, 2) array of this room's tile coordinates."""
+        return self._labels.tiles(self.id)
+
+    def contains(self, x, y):
+        return self._labels.contains(x, y, self.id)
 
     def neighbor_ids(self):
         return frozenset(self._neighbor_ids) if self.id else frozenset()
@@ -47,32 +154,25 @@ class Room:
         return len(self._connection_ids) if self.id else False
 
     def is_corridor(self):
-        if not self.id or not self._tiles:
-            return False
-        first_x, first_y = next(iter(self._tiles))
-        corr_h, corr_v = True, True
-        for x, y in self._tiles:
-            if x != first_x:
-                corr_v = False
-            if y != first_y:
-                corr_h = False
-        if corr_h == corr_v:
+        tiles = self.tiles()
+        if len(tiles) <= 4:
             return False
-        if len(self._tiles) <= 4:
-            return False
-        return True
+        corr_v = np.all(tiles[:, 0] == tiles[0, 0])
+        corr_h = np.all(tiles[:, 1] == tiles[0, 1])
+        return bool(corr_h != corr_v)
 
     def random_location(self, rng) -> Tuple[int, int]:
-        return rng.choice(list(self._tiles))
+        x, y = rng.choice(self.tiles())
+        return x, y
 
     def area(self):
-        return len(self._tiles)
+        return self._labels.count(self.id)
 
     # Internal manipulators for use by Builder
     def _add_tile(self, x, y):
         if self.id == 0:
             return
-        self._tiles.add((x, y))
+        self._labels.place(x, y, self.id)
 
     def _add_neighbor(self, other_id):
         if self.id == 0:
@@ -92,14 +192,17 @@ class Room:
 
 class Wall:
     """Boundary between two rooms."""
+    """A wall with label 0 borders the void, and does not record its tiles."""
     _a: int
     _b: int
-    _tiles: Set[Tuple[int, int]]
-    _door: Tuple[int, int]
-    def __init__(self, a, b):
+    label: int
+    _labels: LabelGrid
+    _doorway: Optional[Tuple[int, int]]
+    def __init__(self, a, b, label, labels):
         self._a = a
         self._b = b
-        self._tiles = set()
+        self.label = label
+        self._labels = labels
         self._doorway = None
 
     @property
@@ -111,7 +214,11 @@ class Wall:
         return self._b
 
     def tiles(self):
-        return frozenset(self._tiles)
+        """Read-only (N, 2) array of this wall's tile coordinates."""
+        return self._labels.tiles(self.label)
+
+    def contains(self, x, y):
+        return self._labels.contains(x, y, self.label)
 
     def adjoins(self, id):
         return self._a == id or self._b == id
@@ -124,34 +231,157 @@ class Wall:
         return self._doorway
 
     def area(self):
-        return len(self._tiles)
+        return self._labels.count(self.label)
 
     # Internal manipulators for use by Builder
     def _add_tile(self, x, y):
-        self._tiles.add((x, y))
+        if self.label == 0:
+            return
+        self._labels.place(x, y, self.label)
 
     def _place_doorway(self, x, y):
         assert self._doorway == None
-        assert (x,y) in self._tiles
+        assert self.contains(x, y)
         self._doorway = (x, y)
 
 
 class BaseMap:
     rooms: List[Room]
     walls: List[Wall]
+    doorways: List[Wall]
+    room_labels: LabelGrid
+    wall_labels: LabelGrid
     entry: Optional[Tuple[int, int]]
     exit: Optional[Tuple[int, int]]
-    def __init__(self, tiles, rooms, walls):
+    _room_walls: Dict[int, Tuple[Wall, ...]]
+    _distances: Dict[int, np.ndarray]
+    def __init__(
+        self, tiles, rooms, walls, doorways, room_labels, wall_labels, room_walls
+    ):
         self.tiles = tiles
         self.rooms = rooms
         self.walls = walls
+        # The walls which have doorways, in the same order as `walls`.
+        self.doorways = doorways
+        self.room_labels = room_labels
+        self.wall_labels = wall_labels
+        self._room_walls = room_walls
         self.entry = None
         self.exit = None
+        # Room distance tables, computed on demand. The connections between
+        # rooms never change once the map is built, so they stay valid.
+        self._distances = {}
+
+    def walls_around(self, room_id) -> Tuple[Wall, ...]:
+        return self._room_walls.get(room_id, ())
+
+    def room_distances(self, room_id: int) -> np.ndarray:
+        """
+        How many connections must one cross to get from this room to each
+        other room? Returns a read-only array indexed by room ID, holding -1
+        for rooms which cannot be reached.
+        """
+        if room_id not in self._distances:
+            distances = self._search(room_id)
+            distances.flags.writeable = False
+            self._distances[room_id] = distances
+        return self._distances[room_id]
+
+    def _room_id_limit(self) -> int:
+        return 1 + max(room.id for room in self.rooms)
+
+    def _search(self, room_id: int) -> np.ndarray:
+        # Breadth-first, so each room is visited once, at its least distance.
+        # Room IDs need not be contiguous; IDs without a room reach nothing.
+        distances = np.full(self._room_id_limit(), -1, dtype=int)
+        rooms = {room.id: room for room in self.rooms}
+        if room_id not in rooms:
+            return distances
+        distances[room_id] = 0
+        queue = deque([room_id])
+        while queue:
+            current = queue.popleft()
+            for next_id in rooms[current].connection_ids():
+                if distances[next_id] < 0:
+                    distances[next_id] = distances[current] + 1
+                    queue.append(next_id)
+        return distances
 
     @property
     def shape(self):
         return self.tiles.shape
 
+    def tile(self, x, y) -> Tile:
+        return Tile(self.tiles[x, y])
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Everything needed to rebuild this map with `from_arrays`, as a few
+        plain integer arrays. Walls are listed in label order, each as
+        (a, b, doorway x, doorway y), with -1 where there is no doorway.
+        """
+        walls = np.full((len(self.walls), 4), -1, dtype=np.int32)
+        for i, wall in enumerate(self.walls):
+            assert wall.label == i+1
+            walls[i, 0:2] = wall.a, wall.b
+            if wall.has_doorway():
+                walls[i, 2:4] = wall.doorway
+        return {
+            "tiles": self.tiles,
+            "room_labels": self.room_labels.labels,
+            "wall_labels": self.wall_labels.labels,
+            "room_ids": np.array([r.id for r in self.rooms], dtype=np.int32),
+            "walls": walls,
+            "entry": np.array(self.entry or (-1, -1), dtype=np.int32),
+            "exit": np.array(self.exit or (-1, -1), dtype=np.int32),
+        }
+
+    @staticmethod
+    def from_arrays(arrays: Dict[str, np.ndarray]) -> BaseMap:
+        """Rebuild a map saved by `to_arrays`."""
+        tiles = np.array(arrays["tiles"], dtype=TILE_DTYPE)
+        room_labels = LabelGrid(tiles.shape)
+        room_labels.labels[...] = arrays["room_labels"]
+        wall_labels = LabelGrid(tiles.shape)
+        wall_labels.labels[...] = arrays["wall_labels"]
+        rooms = {
+            id: Room(id, room_labels) for id in arrays["room_ids"].tolist()
+        }
+        # Every pair of neighboring rooms has a wall between them, and every
+        # connection between rooms is a doorway in their wall.
+        walls = []
+        room_walls: Dict[int, List[Wall]] = {}
+        for label, (a, b, x, y) in enumerate(arrays["walls"].tolist(), 1):
+            wall = Wall(a, b, label, wall_labels)
+            walls.append(wall)
+            room_walls.setdefault(a, []).append(wall)
+            room_walls.setdefault(b, []).append(wall)
+            rooms[a]._add_neighbor(b)
+            rooms[b]._add_neighbor(a)
+            if x >= 0:
+                wall._place_doorway(x, y)
+                rooms[a]._add_connection(b)
+                rooms[b]._add_connection(a)
+        for room in rooms.values():
+            room.neighbors = frozenset(rooms[i] for i in room.neighbor_ids())
+            room.connections = frozenset(
+                rooms[i] for i in room.connection_ids()
+            )
+        maze = BaseMap(
+            tiles=tiles,
+            rooms=list(rooms.values()),
+            walls=walls,
+            doorways=[w for w in walls if w.has_doorway()],
+            room_labels=room_labels,
+            wall_labels=wall_labels,
+            room_walls={k: tuple(v) for k, v in room_walls.items()},
+        )
+        entry = tuple(arrays["entry"].tolist())
+        exit = tuple(arrays["exit"].tolist())
+        maze.entry = entry if entry != (-1, -1) else None
+        maze.exit = exit if exit != (-1, -1) else None
+        return maze
+
 
 
 # Create and manipulate a base map for a game level.
@@ -160,11 +390,21 @@ class BaseMap:
 class Builder:
     _rooms: Dict[int, Room]
     _walls: Dict[Tuple[int, int], Wall]
+    _room_walls: Dict[int, List[Wall]]
+    _doorways: Dict[int, Wall]
+    _room_labels: LabelGrid
+    _wall_labels: LabelGrid
 
     def __init__(self, shape: Tuple[int, int]):
-        self.map = np.full(shape, Tile.VOID, dtype=Tile)
-        self._rooms = {0: Room(0)}
+        self.map = np.full(shape, Tile.VOID, dtype=TILE_DTYPE)
+        self._room_labels = LabelGrid(shape)
+        self._wall_labels = LabelGrid(shape)
+        self._rooms = {0: Room(0, self._room_labels)}
         self._walls = {}
+        # Indexes from each room ID to the walls around it, and from each
+        # wall label to the wall, for walls which have doorways.
+        self._room_walls = {}
+        self._doorways = {}
 
     # Accessors for array-like properties
     @property
@@ -179,6 +419,9 @@ class Builder:
     def height(self):
         return self.map.shape[1]
 
+    def tile(self, x, y) -> Tile:
+        return Tile(self.map[x, y])
+
 
     # Accessors for room graph objects
     def rooms(self):
@@ -196,9 +439,12 @@ class Builder:
         return self._walls[self._wall_key(a_id, b_id)]
 
     def walls_around(self, room_id):
-        for w in self._walls.values():
-            if w.adjoins(room_id):
-                yield w
+        return iter(self._room_walls.get(room_id, ()))
+
+    def doorways(self):
+        """Iterate over the walls with doorways, in order of creation."""
+        for label in sorted(self._doorways):
+            yield self._doorways[label]
 
 
     # Mutators
@@ -220,6 +466,56 @@ class Builder:
         assert self.map[x, y] == Tile.VOID
         self.map[x, y] = Tile.WALL
 
+    def place_tiles(self, floor_ids, wall_mask, wall_a_ids, wall_b_ids):
+        """
+        Bulk equivalent of calling `place_floor`, `place_horz_wall`,
+        `place_vert_wall`, and `place_pillar` for every tile, in x-major
+        order. Arguments are arrays matching the map shape: `floor_ids` holds
+        the room for each floor tile and zero elsewhere; `wall_mask` marks
+        the wall tiles, whose adjoining rooms are in `wall_a_ids` and
+        `wall_b_ids`. A pillar is a wall adjoining room 0 on both sides.
+        """
+        is_floor = floor_ids != 0
+        assert not np.any(is_floor & wall_mask)
+        assert np.all(self.map[is_floor | wall_mask] == Tile.VOID)
+        self.map[is_floor] = Tile.FLOOR
+        self.map[wall_mask] = Tile.WALL
+        self._room_labels.place_many(is_floor, floor_ids)
+
+        # Create rooms in order of first reference, as the per-tile calls
+        # would have done: each floor tile references its room, and each
+        # wall tile references both of its neighbors.
+        refs = np.stack((
+            np.where(wall_mask, wall_a_ids, floor_ids),
+            np.where(wall_mask, wall_b_ids, 0),
+        ), axis=-1).ravel()
+        ref_ids, first_refs = np.unique(refs, return_index=True)
+        for room_id in ref_ids[np.argsort(first_refs)].tolist():
+            self._get_room(room_id)
+
+        # Create walls between pairs of rooms in order of first reference,
+        # taking their orientation from the first tile, then label them.
+        xs, ys = np.nonzero(wall_mask)
+        a_ids = wall_a_ids[xs, ys]
+        b_ids = wall_b_ids[xs, ys]
+        shared = (a_ids != 0) & (b_ids != 0)
+        xs, ys, a_ids, b_ids = xs[shared], ys[shared], a_ids[shared], b_ids[shared]
+        keys = np.minimum(a_ids, b_ids) * (np.max(b_ids, initial=0) + 1)
+        keys += np.maximum(a_ids, b_ids)
+        _, first_refs, key_index = np.unique(
+            keys, return_index=True, return_inverse=True
+        )
+        key_labels = np.zeros(len(first_refs), dtype=np.int32)
+        for i in np.argsort(first_refs).tolist():
+            first = first_refs[i]
+            wall = self._get_wall(a_ids[first].item(), b_ids[first].item())
+            key_labels[i] = wall.label
+            self._rooms[wall.a]._add_neighbor(wall.b)
+            self._rooms[wall.b]._add_neighbor(wall.a)
+        labels = np.zeros_like(self._wall_labels.labels)
+        labels[xs, ys] = key_labels[key_index]
+        self._wall_labels.place_many(labels != 0, labels)
+
     def open_door(self, x, y, a_id, b_id):
         self._open_wall(x, y, a_id, b_id, Tile.DOOR)
 
@@ -239,10 +535,16 @@ class Builder:
             for c_id in room.connection_ids():
                 c_objs.add(self._rooms[c_id])
             room.connections = frozenset(c_objs)
+        # The rooms and walls are views on the label grids, which the map
+        # takes over; the builder must not be used after this.
         return BaseMap(
             tiles=np.copy(self.map),
             rooms=list(self.rooms()),
-            walls=list(self._walls.values())
+            walls=list(self._walls.values()),
+            doorways=list(self.doorways()),
+            room_labels=self._room_labels,
+            wall_labels=self._wall_labels,
+            room_walls={k: tuple(v) for k, v in self._room_walls.items()},
         )
 
 
@@ -250,7 +552,7 @@ class Builder:
     def _get_room(self, room_id) -> Room:
         """This is the only way to create a Room instance."""
         if room_id not in self._rooms:
-            self._rooms[room_id] = Room(room_id)
+            self._rooms[room_id] = Room(room_id, self._room_labels)
         return self._rooms[room_id]
 
     def _wall_key(self, a_id, b_id):
@@ -261,11 +563,15 @@ class Builder:
         """This is the only way to create a Wall instance."""
         # If either wall is the void, return a dummy throwaway wall.
         if a_id == 0 or b_id == 0:
-            return Wall(a_id, b_id)
+            return Wall(a_id, b_id, 0, self._wall_labels)
         assert a_id != b_id
         key = self._wall_key(a_id, b_id)
         if key not in self._walls:
-            self._walls[key] = Wall(a_id, b_id)
+            label = len(self._walls) + 1
+            wall = Wall(a_id, b_id, label, self._wall_labels)
+            self._walls[key] = wall
+            self._room_walls.setdefault(a_id, []).append(wall)
+            self._room_walls.setdefault(b_id, []).append(wall)
         return self._walls[key]
 
     def _place_wall(self, x, y, a_id, b_id):
@@ -282,10 +588,10 @@ class Builder:
         assert a_id in self._rooms[b_id]._neighbor_ids
         assert b_id in self._rooms[a_id]._neighbor_ids
         wall = self._get_wall(a_id, b_id)
-        assert (x, y) in wall._tiles
+        assert wall.contains(x, y)
         assert not wall.has_doorway()
         wall._place_doorway(x, y)
+        self._doorways[wall.label] = wall
         self.map[x, y] = tile_type
         self._get_room(a_id)._add_connection(b_id)
         self._get_room(b_id)._add_connection(a_id)
-
@@ -1,27 +1,70 @@
 import numpy as np
 from .basemap import Tile
 
-def _collect_connections(builder, room_id, katamari):
-    if room_id in katamari:
-        return katamari
-    katamari.add(room_id)
-    room = builder.room(room_id)
-    for conex in room.connection_ids():
-        _collect_connections(builder, conex, katamari)
-
-
-def _disconnected_neighbors(builder, katamari):
-    for room_id in katamari:
-        room = builder.room(room_id)
-        for n_id in room.neighbor_ids():
-            if n_id in katamari:
-                continue
-            yield (room_id, n_id)
+class _Components:
+    """
+    Disjoint sets of room IDs, merged by union-find. Each set also keeps a
+    list of its members, and merging appends the smaller list to the larger.
+    """
+    def __init__(self, room_ids):
+        self._parent = {r: r for r in room_ids}
+        self._members = {r: [r] for r in room_ids}
+
+    def find(self, room_id):
+        root = room_id
+        while self._parent[root] != root:
+            root = self._parent[root]
+        # Compress the path, so later searches go straight to the root.
+        while self._parent[room_id] != root:
+            self._parent[room_id], room_id = root, self._parent[room_id]
+        return root
+
+    def members(self, room_id):
+        return self._members[self.find(room_id)]
+
+    def union(self, a_id, b_id):
+        a_root, b_root = self.find(a_id), self.find(b_id)
+        if a_root == b_root:
+            return
+        if len(self._members[a_root]) < len(self._members[b_root]):
+            a_root, b_root = b_root, a_root
+        self._parent[b_root] = a_root
+        self._members[a_root] += self._members.pop(b_root)
+
+
+class _Frontier:
+    """
+    Set of (inside, outside) room ID pairs, supporting constant-time
+    insertion, removal, and uniform random selection.
+    """
+    def __init__(self):
+        self._pairs = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def add(self, pair):
+        self._index[pair] = len(self._pairs)
+        self._pairs.append(pair)
+
+    def discard(self, pair):
+        i = self._index.pop(pair, None)
+        if i is None:
+            return
+        # Fill the gap with the last pair.
+        last = self._pairs.pop()
+        if i < len(self._pairs):
+            self._pairs[i] = last
+            self._index[last] = i
+
+    def pick(self, rng):
+        return self._pairs[rng.integers(len(self._pairs))]
 
 
 def _open_random_door(builder, a, b, rng):
     wall = builder.wall_between(a, b)
-    x, y = rng.choice(list(wall.tiles()))
+    x, y = rng.choice(wall.tiles())
     if rng.choice([0, 1]):
         builder.open_door(x, y, a, b)
     else:
@@ -33,20 +76,36 @@ def fully(builder, rng):
     # Pick a room at random.
     if not builder.room_ids():
         return
-    other_ids = set(builder.room_ids())
+    room_ids = builder.room_ids()
+    # Group the rooms which are already connected to each other.
+    components = _Components(room_ids)
+    for room in builder.rooms():
+        for c_id in room.connection_ids():
+            components.union(room.id, c_id)
     start_id = rng.choice(list(builder.room_ids()))
+    # The katamari is the set of rooms reachable from the start room; the
+    # frontier lists each pair of neighbors across its edge.
     katamari = set()
-    _collect_connections(builder, start_id, katamari)
-    other_ids -= katamari
-    while other_ids:
-        options = list(_disconnected_neighbors(builder, katamari))
+    frontier = _Frontier()
+    def absorb(room_id):
+        for r_id in components.members(room_id):
+            if r_id in katamari:
+                continue
+            katamari.add(r_id)
+            for n_id in builder.room(r_id).neighbor_ids():
+                if n_id in katamari:
+                    frontier.discard((n_id, r_id))
+                else:
+                    frontier.add((r_id, n_id))
+    absorb(start_id)
+    while len(katamari) < len(room_ids):
+        assert frontier, "some rooms have no path to the rest of the map"
         # Pick a connection at random. Open a random spot in its wall.
-        joint_a, joint_b = rng.choice(options)
+        joint_a, joint_b = frontier.pick(rng)
         _open_random_door(builder, joint_a, joint_b, rng)
-        # Absorb both neighboring connected sets into the work set.
-        _collect_connections(builder, joint_a, katamari)
-        _collect_connections(builder, joint_b, katamari)
-        other_ids -= katamari
+        # Absorb the neighboring connected set into the work set.
+        absorb(joint_b)
+        components.union(joint_a, joint_b)
 
 
 def some(builder, rng):
@@ -80,7 +139,7 @@ def corridors(builder):
         walls = builder.walls_around(room.id)
         for wall in filter(lambda x: 1 == x.area(), walls):
             if not wall.has_doorway():
-                x,y = next(iter(wall.tiles()))
+                x, y = wall.tiles()[0]
                 builder.open_door(x, y, wall.a, wall.b)
 
 
@@ -94,7 +153,7 @@ def lair(builder, rng):
     for room in builder.rooms():
         if room.is_corridor():
             return False
-        if biggest and len(room.tiles()) < len(biggest.tiles()):
+        if biggest and room.area() < biggest.area():
             continue
         biggest = room
     nb_ids = list(biggest.neighbor_ids())
@@ -102,7 +161,7 @@ def lair(builder, rng):
         return False
     for i in range(2):
         wall = builder.wall_between(biggest.id, nb_ids[i])
-        x, y = rng.choice(list(wall.tiles()))
+        x, y = rng.choice(wall.tiles())
         builder.open_door(x, y, biggest.id, nb_ids[i])
     return True
 
@@ -116,6 +175,16 @@ def _adjacent_wall_count(maze):
     mask[::, 1::] += walls[::, 0:-1]
     return mask
 
+def _dilate(mask):
+    # Grow a boolean mask by one tile in every direction, diagonals included.
+    padded = np.pad(mask, 1)
+    grown = np.zeros_like(mask)
+    w, h = mask.shape
+    for dx in range(3):
+        for dy in range(3):
+            grown |= padded[dx:dx+w, dy:dy+h]
+    return grown
+
 def _stair_scores(maze):
     # Compute stair placement desirability score for each maze tile.
     # Maximum score is 4; illegal placements are scored zero.
@@ -124,48 +193,30 @@ def _stair_scores(maze):
     mask = np.where(maze.tiles == Tile.FLOOR, 1, 0)
     # Exclude passages between rooms and all their adjacent tiles, so we
     # do not block movement between rooms.
-    for wall in maze.walls:
-        for x,y in wall.tiles():
-            mask[x,y] = 0
-        if not wall.has_doorway():
-            continue
-        dx,dy = wall.doorway
-        for y in range(max(0, dy-1), min(maze.shape[1], dy+2)):
-            for x in range(max(0, dx-1), min(maze.shape[0], dx+2)):
-                mask[x,y] = 0
+    mask[maze.wall_labels.labels != 0] = 0
+    doorways = np.zeros(maze.shape, dtype=bool)
+    if maze.doorways:
+        xs, ys = np.array([wall.doorway for wall in maze.doorways]).T
+        doorways[xs, ys] = True
+    mask[_dilate(doorways)] = 0
     # Don't block narrow passageways: only their endpoints are usable.
-    for room in maze.rooms:
-        min_x, min_y = maze.shape
-        max_x, max_y = 0, 0
-        # identify the coordinate extremes
-        for x, y in room.tiles():
-            min_x, min_y = min(min_x, x), min(min_y, y)
-            max_x, max_y = max(max_x, x), max(max_y, y)
-        # this only applies to rooms where width or height == 1
-        # (corridors and closets)
-        if max_x != min_x and max_y != min_y:
-            continue
-        # block out any tiles which are not at one of the room's corners
-        for x, y in room.tiles():
-            if x != min_x and x != max_x:
-                mask[x,y] = 0
-            if y != min_y and y != max_y:
-                mask[x,y] = 0
+    # This only applies to rooms where width or height == 1 (corridors and
+    # closets); block out any tiles which are not at one of their corners.
+    low, high = maze.room_labels.bounds()
+    narrow = np.any(low == high, axis=1)
+    xs, ys = maze.room_labels.coords.T
+    labels = maze.room_labels.labels[xs, ys]
+    lx, ly = low[labels].T
+    hx, hy = high[labels].T
+    inner = ((xs != lx) & (xs != hx)) | ((ys != ly) & (ys != hy))
+    blocked = narrow[labels] & inner
+    mask[xs[blocked], ys[blocked]] = 0
     # Having now identified all legal spots, score them: add one point for
     # each adjacent wall tile, thus preferring enclosed spaces.
     wall_bonus = _adjacent_wall_count(maze) * mask
     mask += wall_bonus
     return mask
 
-def _traverse_connections(room, steps, distances):
-    # Record this room's distance from the origin.
-    if room not in distances or distances[room] > steps:
-        distances[room] = steps
-    else:
-        return
-    for connection in room.connections:
-        _traverse_connections(connection, steps+1, distances)
-
 def _room_remoteness(maze):
     """
     How many walls must one cross to reach each room?
@@ -176,33 +227,29 @@ def _room_remoteness(maze):
     don't want the stairs there. Each following floor will begin with its exit
     already defined; we try to put the entry somewhere remote so the player
     will organically have to explore the level before moving on to the next.
+    Returns the distances as an array indexed by room ID.
     """
-    start = None
+    start_id = 0
     if maze.exit:
+        start_id = maze.room_labels.labels[maze.exit]
+    if not start_id:
+        start = None
         for room in maze.rooms:
-            if maze.exit in room.tiles():
-                start = room
-                break
-    if not start:
-        for room in maze.rooms:
-            if start and len(room.tiles()) < len(start.tiles()):
+            if start and room.area() < start.area():
                 continue
             start = room
+        start_id = start.id
     # Compute roomwise distance to each other room.
-    distances = dict()
-    _traverse_connections(start, 0, distances)
-    return distances
+    return maze.room_distances(start_id)
 
 def _remoteness_scores(maze):
     """
     Compute the remoteness score for each floor square in this maze.
     """
-    distances = _room_remoteness(maze)
-    mask = np.zeros_like(maze.tiles)
-    for room, steps in distances.items():
-        for x, y in room.tiles():
-            mask[x, y] = steps
-    return mask
+    # Look up each tile's distance by its room label; label 0 is not a room,
+    # and neither are any rooms we could not reach, so they score zero.
+    steps = np.maximum(_room_remoteness(maze), 0)
+    return steps[maze.room_labels.labels]
 
 def floors(above, below, rng):
     """Create a stairway linking these maps."""
@@ -1,11 +1,31 @@
 
+import contextlib
+import time
 import numpy as np
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from . import offgrid
 from . import basemap
 from . import connect
 
 
+# The stages of generation which `level` and `tower` can time.
+STAGES = ("offgrid", "rasterize", "apply_grid", "connect", "stairs", "entrance")
+
+
+@contextlib.contextmanager
+def _timed(stats, stage):
+    """Add the time spent in this block to `stats[stage + "_seconds"]`."""
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        key = f"{stage}_seconds"
+        stats[key] = stats.get(key, 0.0) + time.perf_counter() - start
+
+
 def _grid_seed(rng):
     return offgrid.hash64(rng.integers(0xFFFFFFFF))
 
@@ -27,30 +47,31 @@ def _coarse_grid(
     width, height = shape
     factor = 4
     scaled_box_size = np.uint(box_size + factor - 1)
-    for left, top, right, bottom in offgrid.generate(
+    rects = offgrid.generate_array(
         width=np.floor_divide(np.uint(width), factor, dtype=np.uint),
         height=np.floor_divide(np.uint(height), factor, dtype=np.uint),
         box_size=np.floor_divide(scaled_box_size, factor, dtype=np.uint),
         seed=seed,
         edge=np.double(edge),
-    ):
-        yield left * factor, top * factor, right * factor, bottom * factor
+    )
+    for field in offgrid.rect_dt.names:
+        rects[field] *= factor
+    return rects
 
 
 def _rasterize(rects, grid):
+    """Number each rect in an `offgrid.rect_dt` array and paint the grid."""
     # Allocate an extra row and column, which will be left empty;
     # this means we can skip the range checks when scanning 2x2 boxes.
     width = grid.shape[0]
     height = grid.shape[1]
-    counter = 0
     grid[:] = 0
-    for rect in rects:
+    # Skip rects that don't lie completely within the requested area
+    inside = (rects["left"] >= 0) & (rects["top"] >= 0)
+    inside &= (rects["right"] <= width) & (rects["bottom"] <= height)
+    # Increment the room counter and assign it to the cell region
+    for counter, rect in enumerate(rects[inside].tolist(), start=1):
         left, top, right, bottom = rect
-        # Skip rects that don't lie completely within the requested area
-        if left < 0 or top < 0 or right > width or bottom > height:
-            continue;
-        # Increment the room counter and assign it to the cell region
-        counter += 1
         grid[left:right, top:bottom] = counter
 
 
@@ -61,28 +82,37 @@ def _apply_grid(grid, builder):
     # resulting map dimensions.
     assert grid.shape[0] > builder.shape[0]
     assert grid.shape[1] > builder.shape[1]
-    for x, y in np.ndindex(builder.shape):
-        # Get the four room indexes touching this grid junction
-        tl = grid[x, y]
-        tr = grid[x+1, y]
-        bl = grid[x, y+1]
-        br = grid[x+1, y+1]
-        if tl == tr == bl == br:
-            builder.place_floor(x, y, tl)
-        elif tl == tr and bl == br:
-            builder.place_horz_wall(x, y, tl, bl)
-        elif tl == bl and tr == br:
-            builder.place_vert_wall(x, y, tl, tr)
-        else:
-            builder.place_pillar(x, y)
+    width, height = builder.shape
+    # Get the four room indexes touching each grid junction
+    tl = grid[0:width, 0:height]
+    tr = grid[1:width+1, 0:height]
+    bl = grid[0:width, 1:height+1]
+    br = grid[1:width+1, 1:height+1]
+    horz = (tl == tr) & (bl == br)
+    vert = (tl == bl) & (tr == br)
+    floor = horz & vert
+    horz &= ~floor
+    vert &= ~floor
+    # Anything which is not a floor is a wall; junctions which are neither
+    # horizontal nor vertical walls are pillars, which adjoin no rooms.
+    builder.place_tiles(
+        floor_ids=np.where(floor, tl, 0),
+        wall_mask=~floor,
+        wall_a_ids=np.where(horz | vert, tl, 0),
+        wall_b_ids=np.select([horz, vert], [bl, tr], 0),
+    )
 
 
 def level(
     shape: Tuple[int, int],
     box_size: np.uint = np.uint(8), # minimum 3
     rng: np.random.Generator = np.random.default_rng(),
+    stats: Optional[Dict[str, float]] = None,
 ) -> basemap.BaseMap:
-    """Generate a basemap for a level having the specified dimensions."""
+    """
+    Generate a basemap for a level having the specified dimensions.
+    If `stats` is provided, record the time spent in each of the `STAGES`.
+    """
     assert box_size >= 3
     width, height = shape
     assert width >= 8 and height >= 8
@@ -95,38 +125,236 @@ def level(
     # one map tile, overscanning the edges, to generate perimeter walls.
     grid = np.zeros((np.uint(width+1), np.uint(height+1)), dtype=np.uint)
     inset = grid[1:width, 1:height]
-    grid_seed = _grid_seed(rng)
-    rects = _coarse_grid(
-        shape=inset.shape,
-        box_size=box_size,
-        seed=np.int64(grid_seed),
-        edge=0.15,
-    )
-    assert rects
-    _rasterize(rects, inset)
-    builder = basemap.Builder(shape=shape)
-    _apply_grid(grid, builder)
+    with _timed(stats, "offgrid"):
+        grid_seed = _grid_seed(rng)
+        rects = _coarse_grid(
+            shape=inset.shape,
+            box_size=box_size,
+            seed=np.int64(grid_seed),
+            edge=0.15,
+        )
+    assert len(rects)
+    with _timed(stats, "rasterize"):
+        _rasterize(rects, inset)
+    with _timed(stats, "apply_grid"):
+        builder = basemap.Builder(shape=shape)
+        _apply_grid(grid, builder)
     # The grid squares have become isolated rooms, separated by walls.
     # Connect these rooms into a playable maze.
-    connect.fully(builder=builder, rng=rng)
-    connect.some(builder=builder, rng=rng)
-    connect.corridors(builder=builder)
-    return builder.build()
+    with _timed(stats, "connect"):
+        connect.fully(builder=builder, rng=rng)
+        connect.some(builder=builder, rng=rng)
+        connect.corridors(builder=builder)
+        return builder.build()
+
+
+# Regions of an unbounded maze are generated on demand, one window at a time.
+# Every room comes from one offgrid cell, and whether each wall has a doorway,
+# and where, depends only on the rects of the two cells it separates; so any
+# two windows agree wherever they overlap. The rooms cannot all be connected
+# by a spanning tree, since there is no end to them: instead each cell opens
+# a door to one of its neighbors above or to its left, chosen by hashing its
+# coordinates, and some other walls get doors to make loops.
+
+# Chance that a wall which is not needed to connect its cells gets a door.
+_LOOP_CHANCE = 0.2
+
+# Neighbors which a cell may choose to connect itself to, as (dx, dy).
+_PARENT_OFFSETS = np.array([(-1, -1), (0, -1), (1, -1), (-1, 0)], dtype=np.int64)
+
+
+def _region_rects(ix, iy, box_size, seed, edge):
+    """The tile rects of these cells, scaled like `_coarse_grid`."""
+    factor = 4
+    scaled_box_size = np.uint(box_size + factor - 1)
+    rects = offgrid.cell_rects(
+        ix,
+        iy,
+        box_size=np.floor_divide(scaled_box_size, factor, dtype=np.uint),
+        seed=seed,
+        edge=np.double(edge),
+    )
+    for field in offgrid.rect_dt.names:
+        rects[field] *= factor
+    return rects
+
+
+def _shared_walls(a, b):
+    """
+    Find the wall tiles between each pair of rects in two `offgrid.rect_dt`
+    arrays, as `_apply_grid` would place them: returns the first tile's x and
+    y, whether the wall runs vertically, and its length, which is zero or
+    less for rects which do not share a wall.
+    """
+    nonempty = (a["left"] < a["right"]) & (a["top"] < a["bottom"])
+    nonempty = nonempty & (b["left"] < b["right"]) & (b["top"] < b["bottom"])
+    vert = (a["right"] == b["left"]) | (b["right"] == a["left"])
+    horz = (a["bottom"] == b["top"]) | (b["bottom"] == a["top"])
+    # The wall tiles lie on the side of the boundary nearer the origin.
+    x = np.where(
+        vert,
+        np.maximum(a["left"], b["left"]) - 1,
+        np.maximum(a["left"], b["left"]),
+    )
+    y = np.where(
+        horz,
+        np.maximum(a["top"], b["top"]) - 1,
+        np.maximum(a["top"], b["top"]),
+    )
+    length = np.where(
+        vert,
+        np.minimum(a["bottom"], b["bottom"]) - 1 - y,
+        np.minimum(a["right"], b["right"]) - 1 - x,
+    )
+    length = np.where(nonempty & (vert | horz), length, 0)
+    return x, y, vert, length
+
+
+def _pair_hashes(first, second, seed):
+    """Hash pairs of (x, y) cell coordinates, in the order given."""
+    first_hash = offgrid.hash_xy_array(first[:, 0], first[:, 1], seed)
+    second_hash = offgrid.hash_xy_array(second[:, 0], second[:, 1], seed)
+    return offgrid.hash_xy_array(
+        first_hash.view(np.int64), second_hash.view(np.int64), seed
+    )
+
+
+def _parents(cells, box_size, seed, edge):
+    """
+    For each (x, y) cell, choose which neighbor it will open a door to, or
+    return (x, y) itself if it shares no wall with any of the candidates.
+    """
+    rects = _region_rects(cells[:, 0], cells[:, 1], box_size, seed, edge)
+    candidates = cells[:, np.newaxis, :] + _PARENT_OFFSETS
+    candidate_rects = _region_rects(
+        candidates[..., 0], candidates[..., 1], box_size, seed, edge
+    )
+    _, _, _, length = _shared_walls(rects[:, np.newaxis], candidate_rects)
+    rank = _pair_hashes(
+        np.repeat(cells, len(_PARENT_OFFSETS), axis=0),
+        candidates.reshape(-1, 2),
+        seed,
+    ).reshape(length.shape)
+    rank = np.where(length > 0, rank, np.iinfo(np.uint64).max)
+    choice = np.argmin(rank, axis=1)
+    parents = candidates[np.arange(len(cells)), choice]
+    return np.where((length > 0).any(axis=1)[:, np.newaxis], parents, cells)
+
+
+def _first_cells(a, b):
+    """Put each pair of (x, y) cells in order, topmost first, then leftmost."""
+    a_first = (a[:, 1] < b[:, 1]) | ((a[:, 1] == b[:, 1]) & (a[:, 0] < b[:, 0]))
+    mask = a_first[:, np.newaxis]
+    return np.where(mask, a, b), np.where(mask, b, a)
+
+
+def _open_region_doors(builder, cells, origin, box_size, seed, edge):
+    """Open the doorways of the walls in this window of the maze."""
+    walls = {}
+    for room_id in builder.room_ids():
+        for wall in builder.walls_around(room_id):
+            walls[(wall.a, wall.b)] = wall
+    if not walls:
+        return
+    pairs = np.array(list(walls), dtype=np.int64)
+    first, second = _first_cells(cells[pairs[:, 0]], cells[pairs[:, 1]])
+    first_rects = _region_rects(first[:, 0], first[:, 1], box_size, seed, edge)
+    second_rects = _region_rects(second[:, 0], second[:, 1], box_size, seed, edge)
+    x, y, vert, length = _shared_walls(first_rects, second_rects)
+    # Each cell is connected to its chosen parent; the later cell of each
+    # pair is the one which may have chosen the other.
+    is_parent = np.all(_parents(second, box_size, seed, edge) == first, axis=1)
+    hashes = _pair_hashes(first, second, seed)
+    loop_chance = np.uint64(_LOOP_CHANCE * 0x10000)
+    is_loop = (hashes >> np.uint64(16)) & np.uint64(0xFFFF) < loop_chance
+    # As `connect.corridors` does, open every one-tile wall of a corridor.
+    is_corridor = _corridor_rects(first_rects) | _corridor_rects(second_rects)
+    is_corridor &= length == 1
+    is_open = (is_parent | is_loop | is_corridor) & (length > 0)
+    offset = (hashes >> np.uint64(32)) % np.maximum(length, 1).astype(np.uint64)
+    offset = offset.astype(np.int64)
+    door_x = x + np.where(vert, 0, offset) - origin[0]
+    door_y = y + np.where(vert, offset, 0) - origin[1]
+    is_door = is_corridor | ((hashes & np.uint64(1)) == 0)
+    inside = (door_x >= 0) & (door_x < builder.width)
+    inside &= (door_y >= 0) & (door_y < builder.height)
+    for i in np.flatnonzero(is_open & inside).tolist():
+        a_id, b_id = pairs[i].tolist()
+        if is_door[i]:
+            builder.open_door(door_x[i], door_y[i], a_id, b_id)
+        else:
+            builder.open_passage(door_x[i], door_y[i], a_id, b_id)
+
+
+def region(
+    window: Tuple[int, int, int, int],
+    seed: np.int64,
+    box_size: np.uint = np.uint(8), # minimum 3
+    edge: float = 0.15, # range 0..0.5, controls irregularity of grid
+) -> Tuple[basemap.BaseMap, np.ndarray]:
+    """
+    Generate the (left, top, right, bottom) window of an unbounded maze,
+    as a basemap whose tile (0, 0) lies at (left, top). Windows generated
+    with the same seed, box size and edge agree on every tile they share.
+    Rooms along the window's edges are cut off, and may only be connected
+    to the rest through rooms outside the window; the map has no entry or
+    exit. Also returns the offgrid cell of each room ID, as an array of
+    (x, y) rows; these identify the rooms across windows.
+    """
+    assert box_size >= 3
+    left, top, right, bottom = (int(n) for n in window)
+    width, height = right - left, bottom - top
+    assert width > 0 and height > 0
+    # Find every cell whose rect might overlap the raster grid: the grid has
+    # one more row and column than the map, and a cell's rect never extends
+    # more than two cells beyond its own corner.
+    cell_size = 4 * ((int(box_size) + 3) // 4)
+    xs = np.arange(left // cell_size - 2, (right+1) // cell_size + 1)
+    ys = np.arange(top // cell_size - 2, (bottom+1) // cell_size + 1)
+    ix, iy = (a.ravel() for a in np.meshgrid(xs, ys, indexing="ij"))
+    rects = _region_rects(ix, iy, box_size, seed, edge)
+    for field, origin, limit in (
+        ("left", left, width+1), ("top", top, height+1),
+        ("right", left, width+1), ("bottom", top, height+1),
+    ):
+        rects[field] = np.clip(rects[field] - origin, 0, limit)
+    keep = (rects["left"] < rects["right"]) & (rects["top"] < rects["bottom"])
+    # The rects of all the cells tile the plane, so every grid square has a
+    # room; room IDs count from 1, in the order `_rasterize` would give.
+    grid = np.zeros((width+1, height+1), dtype=np.uint)
+    _rasterize(rects[keep], grid)
+    assert np.all(grid)
+    cells = np.zeros((np.count_nonzero(keep) + 1, 2), dtype=np.int64)
+    cells[1:, 0] = ix[keep]
+    cells[1:, 1] = iy[keep]
+    builder = basemap.Builder(shape=(width, height))
+    _apply_grid(grid, builder)
+    _open_region_doors(
+        builder, cells, (left, top), box_size, np.int64(seed), edge
+    )
+    return builder.build(), cells
 
 
 def _filter_rects(rects, mask):
     """Return each rect which intersects any nonzero element of the mask."""
     width = mask.shape[0]
     height = mask.shape[1]
-    for left, top, right, bottom in rects:
-        left = np.clip(left, 0, width)
-        top = np.clip(top, 0, height)
-        right = np.clip(right, 0, width)
-        bottom = np.clip(bottom, 0, height)
-        if right-left <= 1 or bottom-top <= 1:
-            continue
-        if np.any(mask[left:right, top:bottom]):
-            yield left, top, right, bottom
+    clipped = np.empty_like(rects)
+    for field, limit in (
+        ("left", width), ("top", height), ("right", width), ("bottom", height)
+    ):
+        clipped[field] = np.clip(rects[field], 0, limit)
+    left, top = clipped["left"], clipped["top"]
+    right, bottom = clipped["right"], clipped["bottom"]
+    # Count the nonzero mask cells under every rect at once, using a summed
+    # area table with an extra zero row and column at the top left.
+    sums = np.zeros((width+1, height+1), dtype=np.int64)
+    sums[1:, 1:] = mask != 0
+    sums = sums.cumsum(axis=0).cumsum(axis=1)
+    covered = sums[right, bottom] - sums[left, bottom]
+    covered += sums[left, top] - sums[right, top]
+    keep = (right-left > 1) & (bottom-top > 1) & (covered > 0)
+    return clipped[keep]
 
 
 def _make_lair_mask(grid, size=8):
@@ -143,7 +371,56 @@ def _make_lair_mask(grid, size=8):
     mask_b = np.add(center_y, half_size, dtype=np.uint)
     assert mask_l >= 0 and mask_t >= 0
     assert mask_r <= width and mask_b <= height
-    _rasterize([(mask_l, mask_t, mask_r, mask_b)], grid)
+    rect = np.array([(mask_l, mask_t, mask_r, mask_b)], dtype=offgrid.rect_dt)
+    _rasterize(rect, grid)
+
+
+def _corridor_rects(rects):
+    """Which of these rects will become corridors, as `Room.is_corridor`?"""
+    # Rooms have one less row and column of floor tiles than their rects.
+    floor_w = rects["right"] - rects["left"] - 1
+    floor_h = rects["bottom"] - rects["top"] - 1
+    return ((floor_w == 1) != (floor_h == 1)) & (floor_w * floor_h > 4)
+
+
+def _lair(grid, mask, rng, max_attempts, stats=None):
+    """
+    Generate the top floor, which is the Lair of Bob. We want exactly three
+    rooms of reasonably proportional size - the antechamber, Bob's room, and
+    the amulet room. There should be exactly two doors and no corridors on
+    this map. We will set up the parameters to make this probable, then loop
+    until we get what we want, or give up after `max_attempts` grids.
+    Returns the lair and the number of grids generated.
+    """
+    width, height = grid.shape[0] - 1, grid.shape[1] - 1
+    inset = grid[1:width, 1:height]
+    for attempt in range(1, max_attempts+1):
+        with _timed(stats, "offgrid"):
+            grid_seed = _grid_seed(rng)
+            # make slightly more regular rooms than normal to encourage the
+            # desired layout to occur.
+            rects = _coarse_grid(
+                shape=inset.shape,
+                box_size=np.uint(5),
+                seed=np.int64(grid_seed),
+                edge=0.22,
+            )
+            rects = _filter_rects(rects, mask)
+        # Every rect becomes one room, so we can reject the wrong number of
+        # rooms, or any corridors, without building the map.
+        if len(rects) != 3 or np.any(_corridor_rects(rects)):
+            continue
+        with _timed(stats, "rasterize"):
+            _rasterize(rects, inset)
+        with _timed(stats, "apply_grid"):
+            builder = basemap.Builder(shape=(width, height))
+            _apply_grid(grid, builder)
+        assert len(builder.room_ids()) == 3
+        with _timed(stats, "connect"):
+            if not connect.lair(builder=builder, rng=rng):
+                continue
+            return builder.build(), attempt
+    raise RuntimeError(f"Failed to generate Bob's lair in {max_attempts} tries")
 
 
 def tower(
@@ -151,7 +428,15 @@ def tower(
     stories: np.uint, # minimum 1
     box_size: np.uint = np.uint(8), # minimum 3
     rng: np.random.Generator = np.random.default_rng(),
+    max_lair_attempts: int = 1000,
+    stats: Optional[Dict[str, float]] = None,
 ) -> List[basemap.BaseMap]:
+    """
+    Generate a basemap for each floor of a tower, ground floor first.
+    If `stats` is provided, record generation statistics in it:
+    `lair_attempts`, the number of grids generated for the top floor, and
+    for each of the `STAGES`, the seconds spent in it as `<stage>_seconds`.
+    """
     assert stories > 0
     width, height = shape
     assert width >= 8 and height >= 8
@@ -164,57 +449,43 @@ def tower(
 
     # The initial mask is a centered area large enough for Lair of Bob
     _make_lair_mask(mask, size=4)
-    # Lair of Bob is special: we want exactly three rooms of reasonably
-    # proportional size - the antechamber, Bob's room, and the amulet room.
-    # There should be exactly two doors and no corridors on this map.
-    # We will set up the parameters to make this probable, then loop until
-    # we get what we want.
-    levels: List[basemap.BaseMap] = list()
-    while not levels:
-        grid_seed = _grid_seed(rng)
-        # make slightly more regular rooms than normal to encourage the
-        # desired layout to occur. 
-        rects = _coarse_grid(
-            shape=inset.shape,
-            box_size=np.uint(5),
-            seed=np.int64(grid_seed),
-            edge=0.22,
-        )
-        inset[:] = 0
-        _rasterize(_filter_rects(rects, mask), inset)
-        builder = basemap.Builder(shape=shape)
-        _apply_grid(grid, builder)
-        if len(builder.room_ids()) != 3:
-            continue
-        if not connect.lair(builder=builder, rng=rng):
-            continue
-        levels.append(builder.build())
+    lair, lair_attempts = _lair(grid, mask, rng, max_lair_attempts, stats)
+    if stats is not None:
+        stats["lair_attempts"] = lair_attempts
+    levels: List[basemap.BaseMap] = [lair]
 
     # Generate the rest of the ziggurat.
     for level in range(1, stories):
         # Add the previous level's footprint to the mask for this level.
         mask[inset.nonzero()] = 1
         # Generate an offset grid and render it into the room grid.
-        grid_seed = _grid_seed(rng)
-        rects = _coarse_grid(
-            shape=inset.shape,
-            box_size=box_size,
-            seed=np.int64(grid_seed),
-            edge=0.1
-        )
+        with _timed(stats, "offgrid"):
+            grid_seed = _grid_seed(rng)
+            rects = _coarse_grid(
+                shape=inset.shape,
+                box_size=box_size,
+                seed=np.int64(grid_seed),
+                edge=0.1
+            )
+            rects = _filter_rects(rects, mask)
         # Rasterize every rectangle which overlays the required mask.
-        _rasterize(_filter_rects(rects, mask), inset)
+        with _timed(stats, "rasterize"):
+            _rasterize(rects, inset)
         # Build a level map from the room grid.
-        builder = basemap.Builder(shape=shape)
-        _apply_grid(grid, builder)
-        connect.fully(builder=builder, rng=rng)
-        connect.some(builder=builder, rng=rng)
-        connect.corridors(builder=builder)
-        levels.append(builder.build())
-        connect.floors(levels[level-1], levels[level], rng)
+        with _timed(stats, "apply_grid"):
+            builder = basemap.Builder(shape=shape)
+            _apply_grid(grid, builder)
+        with _timed(stats, "connect"):
+            connect.fully(builder=builder, rng=rng)
+            connect.some(builder=builder, rng=rng)
+            connect.corridors(builder=builder)
+            levels.append(builder.build())
+        with _timed(stats, "stairs"):
+            connect.floors(levels[level-1], levels[level], rng)
 
     # We generate floors from the top down, appending each one as we create
     # it, but we want to start the game on the bottom floor and move upward.
     levels.reverse()
-    connect.entrance(levels[0], rng)
+    with _timed(stats, "entrance"):
+        connect.entrance(levels[0], rng)
     return levels
@@ -2,10 +2,22 @@
 # Port of Chris Cox's offgrid algorithm, originally found here:
 #  https://gitlab.com/chriscox/offgrid.git
 
-# method of use: call `generate`, iterate over resulting rectangles
+# method of use: call `generate`, iterate over resulting rectangles;
+# or call `generate_array` to get all the rectangles at once, as a structured
+# array of `rect_dt` records.
 
 import numpy as np
 
+# Integer rectangle record, in the same order `generate` yields its tuples.
+rect_dt = np.dtype(
+    [
+        ("left", np.int64),
+        ("top", np.int64),
+        ("right", np.int64),
+        ("bottom", np.int64),
+    ]
+)
+
 def hash64(x: np.int64) -> np.int64:
     ux = np.uint64(x)
     a = np.uint64(6364136223846793005)
@@ -100,6 +112,144 @@ def CellToRect(
     return rectFloat(top, left, bottom, right)
 
 
+# Array versions of the hash functions above, which process every cell at
+# once. All arithmetic happens on uint64 bit patterns: the scalar versions
+# convert back and forth between int64 and uint64, but those conversions
+# only reinterpret the bits, so the results are identical.
+
+def _hash64_array(ux: np.ndarray) -> np.ndarray:
+    a = np.uint64(6364136223846793005)
+    c = np.uint64(1442695040888963407)
+    # array arithmetic wraps around silently, as the algorithm requires
+    temp = ux * a + c
+    righter = temp >> np.uint64(20)
+    lefter = temp << np.uint64(23)
+    return righter ^ lefter ^ temp
+
+
+def _box_random_array(
+    ux: np.ndarray,
+    uy: np.ndarray,
+    useed: np.uint64,
+    edge: np.double # range 0..0.5
+) -> np.ndarray:
+    BITS = np.uint64(30)
+    MASK = (np.uint64(1) << BITS) - np.uint64(1)
+    scale: np.double = 1.0 / np.double(MASK)
+    temp = _hash64_array(_hash64_array(ux) ^ (uy ^ useed))
+    random = (temp & MASK) * scale
+    range = 1.0 - 2.0 * edge
+    return edge + range * random
+
+
+def _cells_to_rects(
+    ix: np.ndarray,
+    iy: np.ndarray,
+    seed: np.int64,
+    edge: np.double # range: 0..0.5
+):
+    """Array version of `CellToRect`: returns (top, left, bottom, right)."""
+    useed = np.array(seed, dtype=np.int64).view(np.uint64)
+    ux = ix.view(np.uint64)
+    uy = iy.view(np.uint64)
+    one = np.uint64(1)
+    # Each cell needs the random values for its four corners.
+    r00 = _box_random_array(ux, uy, useed, edge)
+    r10 = _box_random_array(ux + one, uy, useed, edge)
+    r01 = _box_random_array(ux, uy + one, useed, edge)
+    r11 = _box_random_array(ux + one, uy + one, useed, edge)
+
+    # checkerboard even and odd, vertical and horizontal limits
+    even = ((ix ^ iy) & 0x01) == 0
+    fx = ix.astype(np.double)
+    fy = iy.astype(np.double)
+    left = fx + np.where(even, r00, r01)
+    top = fy + np.where(even, r10, r00)
+    bottom = fy + np.where(even, r01, r11) + 1.0
+    right = fx + np.where(even, r11, r10) + 1.0
+    assert np.all(left <= right)
+    assert np.all(top <= bottom)
+    return top, left, bottom, right
+
+
+def hash_xy_array(ix: np.ndarray, iy: np.ndarray, seed: np.int64) -> np.ndarray:
+    """Array version of `hashXY`, returning the hashes as uint64 bit patterns."""
+    useed = np.array(seed, dtype=np.int64).view(np.uint64)
+    ux = np.asarray(ix, dtype=np.int64).view(np.uint64)
+    uy = np.asarray(iy, dtype=np.int64).view(np.uint64)
+    return _hash64_array(_hash64_array(ux) ^ (uy ^ useed))
+
+
+def cell_rects(
+    ix: np.ndarray,
+    iy: np.ndarray,
+    box_size: np.uint,
+    seed: np.int64,
+    edge: np.double = np.double(0.1) # range: 0..0.5
+) -> np.ndarray:
+    """
+    Compute the rect for each of the given cells, as `rect_dt` records, on an
+    unbounded grid: cell (0, 0) lies near the origin, rather than near the
+    middle of some finite map. Each rect depends only on its cell and the
+    seed, so any part of the grid can be computed without the rest, and the
+    rects of neighboring cells always share their edges exactly.
+    """
+    rect_top, rect_left, rect_bottom, rect_right = _cells_to_rects(
+        iy=np.asarray(iy, dtype=np.int64),
+        ix=np.asarray(ix, dtype=np.int64),
+        seed=seed,
+        edge=edge,
+    )
+    scale = np.double(box_size)
+    rects = np.empty(rect_top.shape, dtype=rect_dt)
+    rects["top"] = np.floor(scale * rect_top)
+    rects["left"] = np.floor(scale * rect_left)
+    rects["bottom"] = np.floor(scale * rect_bottom)
+    rects["right"] = np.floor(scale * rect_right)
+    return rects
+
+
+def generate_array(
+    width: np.uint,
+    height: np.uint,
+    box_size: np.uint,
+    seed: np.int64,
+    edge: np.double = np.double(0.1) # range: 0..0.5
+) -> np.ndarray:
+    """
+    Compute every rect `generate` would yield, in the same order, all at once.
+    Returns a one-dimensional array of `rect_dt` records.
+    """
+    boxes_wide = np.floor_divide(width, box_size, dtype=np.int64)
+    boxes_high = np.floor_divide(height, box_size, dtype=np.int64)
+    half_wide = np.floor_divide(boxes_wide, 2)
+    half_high = np.floor_divide(boxes_high, 2)
+
+    # Same overscan as `generate`; rows vary slowest, matching its loop order.
+    iy, ix = np.meshgrid(
+        np.arange(-2, boxes_high+1, dtype=np.int64) - half_high,
+        np.arange(-2, boxes_wide+1, dtype=np.int64) - half_wide,
+        indexing="ij",
+    )
+    rect_top, rect_left, rect_bottom, rect_right = _cells_to_rects(
+        iy=iy.ravel(),
+        ix=ix.ravel(),
+        seed=seed,
+        edge=edge,
+    )
+
+    # Round exactly as `generate` does, truncating after the offset.
+    scale = np.double(box_size)
+    half_width = np.uint(width) / 2
+    half_height = np.uint(height) / 2
+    rects = np.empty(rect_top.shape, dtype=rect_dt)
+    rects["top"] = np.floor(scale * rect_top) + half_height + 1
+    rects["left"] = np.floor(scale * rect_left) + half_width + 1
+    rects["bottom"] = np.floor(scale * rect_bottom) + half_height + 1
+    rects["right"] = np.floor(scale * rect_right) + half_width + 1
+    return rects
+
+
 def generate(
     width: np.uint,
     height: np.uint,
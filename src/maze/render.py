@@ -5,7 +5,7 @@ import numpy as np
 from dataclasses import dataclass
 from typing import Any
 
-from .basemap import Tile
+from .basemap import WALL, FLOOR, DOOR, DEBUG
 
 
 @dataclass
@@ -34,25 +34,9 @@ class Palette:
     debug: Any
 
 
-def place_door(grid, x, y, palette: Palette):
-    # If there are walls above and below, return a vertical door.
-    # If there are walls left and right, return a horizontal door.
-    # Otherwise - this should never happen - return a plus sign.
-    if y > 0 and (y+1) < grid.shape[1]:
-        if grid[x, y-1] == Tile.WALL and grid[x, y+1] == Tile.WALL:
-            return palette.door_V
-    if x > 0 and (x+1) < grid.shape[0]:
-        if grid[x-1, y] == Tile.WALL and grid[x+1, y] == Tile.WALL:
-            return palette.door_H
-    return palette.door
-
-
-def place_wall(grid, x: np.uint, y:np.uint, palette: Palette):
-    wall_left = x > 0 and grid[x-1, y] == Tile.WALL
-    wall_above = y > 0 and grid[x, y-1] == Tile.WALL
-    wall_right = (x+1) < grid.shape[0] and grid[x+1, y] == Tile.WALL
-    wall_below = (y+1) < grid.shape[1] and grid[x, y+1] == Tile.WALL
-    glyphs = [             # L A R B
+def wall_glyphs(palette: Palette):
+    """List the wall glyphs in LARB order, as indexed by `larb_mask`."""
+    return [               # L A R B
         palette.wall,      # . . . .
         palette.wall_B,    # . . . X
         palette.wall_R,    # . . X .
@@ -70,29 +54,75 @@ def place_wall(grid, x: np.uint, y:np.uint, palette: Palette):
         palette.wall_LAR,  # X X X .
         palette.wall_LARB, # X X X X
     ]
+
+
+def door_glyphs(palette: Palette):
+    """List the door glyphs in LARB order, as indexed by `larb_mask`."""
+    # If there are walls above and below, use a vertical door.
+    # If there are walls left and right, use a horizontal door.
+    # Otherwise - this should never happen - use a plus sign.
+    glyphs = []
+    for index in range(16):
+        if (index & 0b0101) == 0b0101:
+            glyphs.append(palette.door_V)
+        elif (index & 0b1010) == 0b1010:
+            glyphs.append(palette.door_H)
+        else:
+            glyphs.append(palette.door)
+    return glyphs
+
+
+def larb_mask(grid):
+    """
+    Given a boolean array, compute a 4-bit mask for each element showing which
+    of its neighbors are set: left = 8, above = 4, right = 2, below = 1.
+    Neighbors beyond the edge of the array count as unset.
+    """
+    padded = np.pad(grid, 1, constant_values=False).astype(np.uint8)
+    mask = padded[:-2, 1:-1] << 3
+    mask |= padded[1:-1, :-2] << 2
+    mask |= padded[2:, 1:-1] << 1
+    mask |= padded[1:-1, 2:]
+    return mask
+
+
+def place_door(grid, x, y, palette: Palette):
+    # If there are walls above and below, return a vertical door.
+    # If there are walls left and right, return a horizontal door.
+    # Otherwise - this should never happen - return a plus sign.
+    if y > 0 and (y+1) < grid.shape[1]:
+        if grid[x, y-1] == WALL and grid[x, y+1] == WALL:
+            return palette.door_V
+    if x > 0 and (x+1) < grid.shape[0]:
+        if grid[x-1, y] == WALL and grid[x+1, y] == WALL:
+            return palette.door_H
+    return palette.door
+
+
+def place_wall(grid, x: np.uint, y:np.uint, palette: Palette):
+    wall_left = x > 0 and grid[x-1, y] == WALL
+    wall_above = y > 0 and grid[x, y-1] == WALL
+    wall_right = (x+1) < grid.shape[0] and grid[x+1, y] == WALL
+    wall_below = (y+1) < grid.shape[1] and grid[x, y+1] == WALL
     index = 0
     index += 8 if wall_left else 0
     index += 4 if wall_above else 0
     index += 2 if wall_right else 0
     index += 1 if wall_below else 0
-    return glyphs[index]
+    return wall_glyphs(palette)[index]
 
 
 def tiles(src, dest, palette: Palette):
     assert len(src.shape) == 2 and len(dest.shape) == 2
     assert dest.shape[0] >= src.shape[0] and dest.shape[1] >= src.shape[1]
-    for x, y in np.ndindex(src.shape):
-        src_val = src[x, y]
-        dest_val = palette.void
-        if src_val == Tile.VOID:
-            dest_val = palette.void
-        elif src_val == Tile.FLOOR:
-            dest_val = palette.floor
-        elif src_val == Tile.DOOR:
-            dest_val = place_door(src, x, y, palette)
-        elif src_val == Tile.WALL:
-            dest_val = place_wall(src, x, y, palette)
-        elif src_val == Tile.DEBUG:
-            dest_val = palette.debug
-        dest[x, y] = dest_val
-
+    # Work out which neighbors of every tile are walls, then look up each
+    # wall and door glyph in a table indexed by that mask.
+    walls = larb_mask(src == WALL)
+    out = dest[:src.shape[0], :src.shape[1]]
+    out[...] = palette.void
+    out[src == FLOOR] = palette.floor
+    out[src == DEBUG] = palette.debug
+    is_door = src == DOOR
+    out[is_door] = np.array(door_glyphs(palette))[walls[is_door]]
+    is_wall = src == WALL
+    out[is_wall] = np.array(wall_glyphs(palette))[walls[is_wall]]
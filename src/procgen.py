@@ -1,16 +1,19 @@
 from __future__ import annotations
 
-from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING
+from typing import Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
 from dataclasses import dataclass
+from functools import lru_cache
 
 import tcod
 import numpy as np
 
 import entity_factories
 from game_map import GameMap
+from tile_palette import TilePalette
 import tile_types
 import maze.create
 from maze import basemap
+from maze.render import larb_mask
 import graphics
 from src.entity_factories import Death_Scroll
 
@@ -71,63 +74,145 @@ def get_max_value_for_floor(
         else:
             current_value = value
     return current_value
-def get_entities_at_random(
-    weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]],
-    number_of_entities: int,
-    floor: int,
-    rng: np.random.Generator
- ) -> List[Entity]:
-    entity_weighted_chances = {}
-    for key, values in weighted_chances_by_floor.items():
-        if key > floor:
-            break
-        else:
-            for value in values:
-                entity = value[0]
-                weighted_chance = value[1]
 
+
+@dataclass
+class SpawnTable:
+    """
+    The entities which may spawn on some floor, compiled for the alias
+    method: to choose one, pick a column uniformly, then take the column's
+    own entity with probability `keep`, or else its `alias`.
+    """
+    entities: List[Entity]
+    keep: np.ndarray
+    alias: np.ndarray
+
+    @classmethod
+    def compile(
+        cls,
+        weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]],
+        floor: int,
+    ) -> SpawnTable:
+        # Later floors' chances override earlier ones for the same entity.
+        entity_weighted_chances = {}
+        for key, values in weighted_chances_by_floor.items():
+            if key > floor:
+                break
+            for entity, weighted_chance in values:
                 entity_weighted_chances[entity] = weighted_chance
+        entities = list(entity_weighted_chances.keys())
+        weights = np.array(list(entity_weighted_chances.values()), dtype=float)
+        # Vose's method: pair each column below the average weight with one
+        # above it, which makes up the difference.
+        scaled = weights * len(weights) / weights.sum()
+        keep = np.ones(len(weights))
+        alias = np.arange(len(weights))
+        small = [i for i, w in enumerate(scaled) if w < 1]
+        large = [i for i, w in enumerate(scaled) if w >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            keep[less], alias[less] = scaled[less], more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        return cls(entities, keep, alias)
+
+    def choose(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Return the index of an entity for each of these samples, which must
+        be uniformly distributed in [0, 1).
+        """
+        columns = samples * len(self.entities)
+        index = np.minimum(columns.astype(np.intp), len(self.entities) - 1)
+        return np.where(columns - index < self.keep[index], index, self.alias[index])
+
+
+@lru_cache(maxsize=None)
+def spawn_tables(floor: int) -> Tuple[SpawnTable, SpawnTable]:
+    """The monster and item spawn tables for this floor."""
+    return (
+        SpawnTable.compile(enemy_chances, floor),
+        SpawnTable.compile(item_chances, floor),
+    )
 
-    entities = list(entity_weighted_chances.keys())
-    entity_chance_weights = list(entity_weighted_chances.values())
 
-    # get p-values by dividing each value by the sum of the weights
-    total_weight = np.sum(entity_chance_weights)
-    entity_probabilities = np.divide(entity_chance_weights, total_weight)
-    chosen_entities = rng.choice(
-        entities, size=number_of_entities, p=entity_probabilities
+def choose_entities(
+    rooms: List[basemap.Room],
+    floor_number: int,
+    rng: np.random.Generator
+) -> List[List[Entity]]:
+    """
+    Choose the monsters, then the items, for each of these rooms, using one
+    array of samples from the generator for the whole floor.
+    """
+    monsters, items = spawn_tables(floor_number)
+    max_monsters = get_max_value_for_floor(max_monsters_by_floor, floor_number)
+    max_items = get_max_value_for_floor(max_items_by_floor, floor_number)
+    # Per room, a sample for the number of monsters, one for the number of
+    # items, then one for each monster and item there might be.
+    samples = rng.random((len(rooms), 2 + max_monsters + max_items))
+    number_of_monsters = 1 + np.minimum(
+        (samples[:, 0] * max_monsters).astype(int), max_monsters - 1
+    )
+    number_of_items = np.minimum(
+        (samples[:, 1] * (max_items + 1)).astype(int), max_items
     )
-    return chosen_entities.tolist()
+    chosen_monsters = monsters.choose(samples[:, 2:2+max_monsters])
+    chosen_items = items.choose(samples[:, 2+max_monsters:])
+    return [
+        [monsters.entities[i] for i in chosen_monsters[room, :number_of_monsters[room]]]
+        + [items.entities[i] for i in chosen_items[room, :number_of_items[room]]]
+        for room in range(len(rooms))
+    ]
+
+
+class SpawnSites:
+    """
+    The free tiles of each room on a floor, for spawning entities on. An
+    occupancy bitmap of the floor marks the tiles already taken; each room's
+    free tiles are found the first time something spawns there.
+    """
+    occupied: np.ndarray
+    _free: Dict[int, np.ndarray]
+
+    def __init__(self, dungeon: GameMap):
+        self.occupied = np.zeros((dungeon.width, dungeon.height), dtype=bool)
+        for entity in dungeon.entities:
+            self.occupied[entity.x, entity.y] = True
+        self._free = {}
+
+    def draw(
+        self, room: basemap.Room, count: int, rng: np.random.Generator
+    ) -> np.ndarray:
+        """
+        Choose up to `count` distinct free tiles in this room, as an (N, 2)
+        array of coordinates, and mark them occupied.
+        """
+        free = self._free.get(room.id)
+        if free is None:
+            tiles = room.tiles()
+            free = tiles[~self.occupied[tiles[:, 0], tiles[:, 1]]]
+        picks = rng.choice(len(free), size=min(count, len(free)), replace=False)
+        chosen = free[picks]
+        self._free[room.id] = np.delete(free, picks, axis=0)
+        self.occupied[chosen[:, 0], chosen[:, 1]] = True
+        return chosen
 
 
 def place_entities(
     room: basemap.Room,
     dungeon: GameMap,
-    floor_number: int,
+    entities: List[Entity],
+    sites: SpawnSites,
     rng: np.random.Generator
 ) -> None:
-    number_of_monsters = rng.integers(
-        1, get_max_value_for_floor(max_monsters_by_floor, floor_number),
-        endpoint=True
-    )
-    number_of_items = rng.integers(
-        0, get_max_value_for_floor(max_items_by_floor, floor_number),
-        endpoint=True
-    )
-    monsters: List[Entity] = get_entities_at_random(
-        enemy_chances, number_of_monsters, floor_number, rng
-    )
-    items: List[Entity] = get_entities_at_random(
-        item_chances, number_of_items, floor_number, rng
-    )
-    for entity in monsters + items:
-        x, y = room.random_location(rng)
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-            entity.spawn(dungeon, x, y)
+    # If the room is too full for all of them, the last ones are left out.
+    for entity, (x, y) in zip(entities, sites.draw(room, len(entities), rng)):
+        entity.spawn(dungeon, int(x), int(y))
 
 
 def populate_rooms(
     dungeon: GameMap,
+    base_map: basemap.BaseMap,
     rooms: List[basemap.Room],
     floor: int,
     rng: np.random.Generator,
@@ -139,7 +224,7 @@ def populate_rooms(
         entity_factories.upward_stairs.spawn(dungeon, x, y)
     else:
         # this must be Bob's lair, at the top of the tower
-        populate_lair(dungeon, rooms, rng)
+        populate_lair(dungeon, base_map, rooms, rng)
     if dungeon.entry_location:
         x, y = dungeon.entry_location
         if floor > 1:
@@ -147,129 +232,158 @@ def populate_rooms(
         else:
             entity_factories.door_outside.spawn(dungeon, x, y)
     # Put some monsters and loot items in each room
-    for room in rooms:
-        place_entities(room, dungeon, floor, rng)
+    sites = SpawnSites(dungeon)
+    for room, entities in zip(rooms, choose_entities(rooms, floor, rng)):
+        place_entities(room, dungeon, entities, sites, rng)
 
 
 def populate_lair(
     dungeon: GameMap,
+    base_map: basemap.BaseMap,
     rooms: List[basemap.Room],
     rng: np.random.Generator
 ):
     # Take Bob's savings in the room furthest from the stairs.
-    # We know there are only three rooms in the lair, so the room which does
-    # not have the stairs, and has only one connection, must be the one.
-    for room in rooms:
-        if dungeon.entry_location in room.tiles():
-            continue
-        if room.connections and len(room.connections) > 1:
-            continue
-        x, y = room.random_location(rng)
-        entity_factories.amulet_of_yendor.spawn(dungeon, x, y)
-        break
+    x, y = dungeon.entry_location
+    distances = base_map.room_distances(entry_room_id(base_map, x, y))
+    room = max(rooms, key=lambda room: distances[room.id])
+    x, y = room.random_location(rng)
+    entity_factories.amulet_of_yendor.spawn(dungeon, x, y)
+
+
+def entry_room_id(base_map: basemap.BaseMap, x: int, y: int) -> int:
+    """
+    The ID of the room one enters the floor into from (x, y). Stairs stand in
+    a room, but the door outside is in the perimeter wall, which belongs to no
+    room; it leads into the one room beside it.
+    """
+    labels = base_map.room_labels.labels
+    if labels[x, y]:
+        return int(labels[x, y])
+    width, height = labels.shape
+    for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+        if 0 <= nx < width and 0 <= ny < height and labels[nx, ny]:
+            return int(labels[nx, ny])
+    raise ValueError(f"No room adjoins the entry at {(x, y)}")
+
+
+# Glyph tables for each floor and wall style, indexed by style, then by the
+# LARB mask of the tile's neighbors.
+FLOOR_TABLE = np.array([glyphs.codes for glyphs in graphics.FLOORS])
+WALL_TABLE = np.array([glyphs.codes for glyphs in graphics.WALLS])
+# Walls facing the outside of the tower have no room to take a style from.
+OUTER_WALLS = graphics.WALL_BRICK[3].codes
+
+LEFT, ABOVE, RIGHT, BELOW = 8, 4, 2, 1
 
 
 @dataclass
-class RoomStyle:
-    floor_glyphs: graphics.FloorTiles
-    wall_glyphs: graphics.WallTiles
+class RoomStyles:
+    """The floor and wall style of each room, indexed by room ID."""
+    floor: np.ndarray
+    wall: np.ndarray
 
 
 def style_rooms(
     base_map: maze.basemap.BaseMap,
     rng: np.random.Generator,
-):
-    room_styles: Dict[int, RoomStyle] = dict()
+) -> RoomStyles:
+    id_limit = max((room.id for room in base_map.rooms), default=0) + 1
+    styles = RoomStyles(
+        floor=np.zeros(id_limit, dtype=np.intp),
+        wall=np.zeros(id_limit, dtype=np.intp),
+    )
     for room in base_map.rooms:
         # Pick a floor style completely at random.
-        floor_style = rng.integers(0, len(graphics.FLOORS))
-        floor_glyphs = graphics.FLOORS[floor_style]
-        wall_style = rng.integers(0, len(graphics.WALLS))
-        wall_glyphs = graphics.WALLS[wall_style]
-        room_styles[room.id] = RoomStyle(
-            floor_glyphs=floor_glyphs,
-            wall_glyphs=wall_glyphs
-        )
-    return room_styles
+        styles.floor[room.id] = rng.integers(0, len(graphics.FLOORS))
+        styles.wall[room.id] = rng.integers(0, len(graphics.WALLS))
+    return styles
+
+def _adjoin_many(left_codes: np.ndarray, right_codes: np.ndarray) -> np.ndarray:
+    """
+    Array version of `graphics.adjoin`. Each distinct pair is adjoined once,
+    in order of first appearance, so new glyphs are made in the same order as
+    calling `adjoin` on every pair in turn would make them.
+    """
+    pairs = np.stack((left_codes, right_codes), axis=-1)
+    unique, first, inverse = np.unique(
+        pairs, axis=0, return_index=True, return_inverse=True
+    )
+    codes = np.zeros(len(unique), dtype=np.int64)
+    for i in np.argsort(first).tolist():
+        left, right = unique[i].tolist()
+        codes[i] = graphics.adjoin(left, right)
+    return codes[inverse.reshape(-1)]
 
 def paint_floors(
     base_map: maze.basemap.BaseMap,
-    dungeon: GameMap,
-    room_styles: Dict[int, RoomStyle],
+    painted: np.ndarray,
+    room_styles: RoomStyles,
     rng: np.random.Generator,
 ):
     """Paint the dungeon with floor tiles appropriate to each room."""
-    map_shape = base_map.shape
-    out = np.zeros_like(base_map.tiles, dtype=np.uint)
-    for room in base_map.rooms:
-        glyphs = room_styles[room.id].floor_glyphs
-        tiles = base_map.tiles
-        WALL = basemap.Tile.WALL
-        for x, y in room.tiles():
-            left = x > 0 and tiles[x-1, y] != WALL
-            above = y > 0 and tiles[x, y-1] != WALL
-            right = (x+1) < map_shape[0] and tiles[x+1, y] != WALL
-            below = (y+1) < map_shape[1] and tiles[x, y+1] != WALL
-            code = glyphs.pick(left=left, above=above, right=right, below=below)
-            dungeon.tiles[x,y] = tile_types.floor(code)
-            out[x, y] = room.id
-    return out
+    room_grid = base_map.room_labels.labels
+    is_floor = room_grid != 0
+    open_sides = larb_mask(base_map.tiles != basemap.WALL)
+    styles = room_styles.floor[room_grid[is_floor]]
+    codes = FLOOR_TABLE[styles, open_sides[is_floor]]
+    painted[is_floor] = tile_types.floors(codes)
+    return np.where(is_floor, room_grid, 0).astype(np.uint)
 
 def paint_doors(
     base_map: maze.basemap.BaseMap,
     room_grid,
-    dungeon: GameMap,
-    room_styles: Dict[int, RoomStyle],
+    painted: np.ndarray,
+    room_styles: RoomStyles,
     rng: np.random.Generator,
 ):
-    WALL = basemap.Tile.WALL
-    DOOR = basemap.Tile.DOOR
-    for wall in base_map.walls:
-        if not wall.has_doorway():
-            continue
-        # Is it a vertical or horizontal door?
-        # Every door must have either walls above and below, or left and right.
-        x, y = wall.doorway
-        if base_map.tiles[x, y-1] == WALL:
-            assert base_map.tiles[x, y+1] == WALL
-            assert base_map.tiles[x-1, y] != WALL
-            assert base_map.tiles[x+1, y] != WALL
-            # Vertical door: use adjoining tile left & right
-            left_room_id = room_grid[x-1, y]
-            left_glyphs = room_styles[left_room_id].floor_glyphs
-            right_room_id = room_grid[x+1, y]
-            right_glyphs = room_styles[right_room_id].floor_glyphs
-            left_code = left_glyphs.pick(left=True, right=True)
-            right_code = right_glyphs.pick(left=True, right=True)
-            pass_code = graphics.adjoin(left_code, right_code)
-            if base_map.tiles[x,y] == DOOR:
-                # doorway
-                door_code = graphics.composite(pass_code, graphics.DOOR_V)
-                dungeon.tiles[x,y] = tile_types.door(door_code)
-            else:
-                # open passageway
-                dungeon.tiles[x,y] = tile_types.floor(pass_code)
-        elif base_map.tiles[x-1, y] == WALL:
-            assert base_map.tiles[x+1, y] == WALL
-            assert base_map.tiles[x, y-1] != WALL
-            assert base_map.tiles[x, y+1] != WALL
-            # Horizontal door: use lower tile
-            below_room_id = room_grid[x, y+1]
-            glyphs = room_styles[below_room_id].floor_glyphs
-            pass_code = glyphs.pick(above=True, below=True)
-            if base_map.tiles[x,y] == DOOR:
-                # doorway
-                door_code = graphics.composite(pass_code, graphics.DOOR_H)
-                dungeon.tiles[x,y] = tile_types.door(door_code)
-            else:
-                # open passageway
-                dungeon.tiles[x,y] = tile_types.floor(pass_code)
+    WALL = basemap.WALL
+    DOOR = basemap.DOOR
+    if not base_map.doorways:
+        return
+    tiles = base_map.tiles
+    xs, ys = np.array([wall.doorway for wall in base_map.doorways]).T
+    # Every door must have either walls above and below, or left and right.
+    vertical = tiles[xs, ys-1] == WALL
+    horizontal = ~vertical & (tiles[xs-1, ys] == WALL)
+    assert np.all(tiles[xs[vertical], ys[vertical]+1] == WALL)
+    assert np.all(tiles[xs[horizontal]+1, ys[horizontal]] == WALL)
+    # Vertical doors use the adjoining tiles left & right; horizontal doors
+    # use the tile below.
+    left_codes = FLOOR_TABLE[
+        room_styles.floor[room_grid[xs-1, ys]], LEFT | RIGHT
+    ]
+    right_codes = FLOOR_TABLE[
+        room_styles.floor[room_grid[np.minimum(xs+1, tiles.shape[0]-1), ys]],
+        LEFT | RIGHT
+    ]
+    below_codes = FLOOR_TABLE[
+        room_styles.floor[room_grid[xs, np.minimum(ys+1, tiles.shape[1]-1)]],
+        ABOVE | BELOW
+    ]
+    is_door = tiles[xs, ys] == DOOR
+    # Make the glyphs door by door, as they are needed.
+    codes = np.zeros(len(xs), dtype=np.int64)
+    for i in np.flatnonzero(vertical | horizontal).tolist():
+        if vertical[i]:
+            codes[i] = graphics.adjoin(int(left_codes[i]), int(right_codes[i]))
+            door_glyph = graphics.DOOR_V
+        else:
+            codes[i] = below_codes[i]
+            door_glyph = graphics.DOOR_H
+        if is_door[i]:
+            codes[i] = graphics.composite(int(codes[i]), door_glyph)
+    # Doorways get door tiles; open passageways get floor tiles.
+    door_at = (vertical | horizontal) & is_door
+    pass_at = (vertical | horizontal) & ~is_door
+    painted[xs[door_at], ys[door_at]] = tile_types.doors(codes[door_at])
+    painted[xs[pass_at], ys[pass_at]] = tile_types.floors(codes[pass_at])
 
 def paint_walls(
     base_map: maze.basemap.BaseMap,
     room_grid,
-    dungeon: GameMap,
-    room_styles: Dict[int, RoomStyle],
+    painted: np.ndarray,
+    room_styles: RoomStyles,
     rng: np.random.Generator,
 ):
     """
@@ -278,105 +392,127 @@ def paint_walls(
     """
     map_shape = room_grid.shape
     assert map_shape == base_map.tiles.shape
-    assert map_shape == dungeon.tiles.shape
-    WALL = basemap.Tile.WALL
-    tiles = base_map.tiles
+    assert map_shape == painted.shape
+    is_wall = base_map.tiles == basemap.WALL
     # Simplify the wall-painting logic by munging the room grid, in which all
     # wall squares are currently zero. Our quasi-isometric perspective means
     # that horizontal walls take their style from the room below. We will
     # fill each zero square with the value from the row above, and this way we
     # don't have to worry so much about corners and T-pieces.
-    smear_grid = np.zeros_like(room_grid)
-    for y in range(map_shape[1]):
-        for x in range(map_shape[0]):
-            if room_grid[x,y]:
-                smear_grid[x,y] = room_grid[x,y]
-            elif (y+1)<map_shape[1]:
-                smear_grid[x,y] = room_grid[x,y+1]
-    room_grid = smear_grid
-    outer_glyphs = graphics.WALL_BRICK[3]
-
-    for x, y in np.ndindex(map_shape):
-        if base_map.tiles[x, y] != WALL:
-            continue
-        left = x > 0 and tiles[x-1, y] == WALL
-        above = y > 0 and tiles[x, y-1] == WALL
-        right = (x+1) < map_shape[0] and tiles[x+1, y] == WALL
-        below = (y+1) < map_shape[1] and tiles[x, y+1] == WALL
-
-        mono_style = room_grid[x,y]
-        left_style = room_grid[x-1,y] if x > 0 else 0
-        right_style = room_grid[x+1,y] if (x+1) < map_shape[0] else 0
-        if mono_style:
-            # associated with a single room
-            code = room_styles[mono_style].wall_glyphs.pick(
-                left=left, above=above, right=right, below=below
-            )
-            dungeon.tiles[x,y] = tile_types.wall(code)
-        elif left_style and right_style:
-            # a wall adjoining two rooms
-            l_glyphs = room_styles[left_style].wall_glyphs
-            r_glyphs = room_styles[right_style].wall_glyphs
-            l_code = l_glyphs.pick(left=left, above=above, right=right, below=below)
-            r_code = r_glyphs.pick(left=left, above=above, right=right, below=below)
-            wall_code = graphics.adjoin(l_code, r_code)
-            dungeon.tiles[x,y] = tile_types.wall(wall_code)
-        elif right_style:
-            # outer wall on left side of tower
-            l_code = outer_glyphs.pick(left=left, above=above, right=right, below=below)
-            r_glyphs = room_styles[right_style].wall_glyphs
-            r_code = r_glyphs.pick(left=left, above=above, right=right, below=below)
-            wall_code = graphics.adjoin(l_code, r_code)
-            dungeon.tiles[x,y] = tile_types.wall(wall_code)
-        elif left_style:
-            # outer wall on right side of tower
-            r_code = outer_glyphs.pick(left=left, above=above, right=right, below=below)
-            l_glyphs = room_styles[left_style].wall_glyphs
-            l_code = l_glyphs.pick(left=left, above=above, right=right, below=below)
-            wall_code = graphics.adjoin(l_code, r_code)
-            dungeon.tiles[x,y] = tile_types.wall(wall_code)
-        elif y > 0:
-            #outer wall below tower
-            code = outer_glyphs.pick(
-                left=left, above=above, right=right, below=below
-            )
-            dungeon.tiles[x,y] = tile_types.wall(code)
+    below = np.zeros_like(room_grid)
+    below[:, :-1] = room_grid[:, 1:]
+    smear_grid = np.where(room_grid != 0, room_grid, below)
+    left_style = np.zeros_like(smear_grid)
+    left_style[1:, :] = smear_grid[:-1, :]
+    right_style = np.zeros_like(smear_grid)
+    right_style[:-1, :] = smear_grid[1:, :]
+
+    # Pick each wall's glyph from the style of the room it belongs to; a wall
+    # between two rooms, or between a room and the outside, is made of the
+    # left half of one glyph and the right half of the other. A wall along
+    # the top edge of the map, with no room on any side, stays unpainted.
+    xs, ys = np.nonzero(is_wall)
+    sides = larb_mask(is_wall)[xs, ys]
+    mono = smear_grid[xs, ys]
+    left = left_style[xs, ys]
+    right = right_style[xs, ys]
+    outer_codes = OUTER_WALLS[sides]
+    mono_codes = WALL_TABLE[room_styles.wall[mono], sides]
+    left_codes = np.where(
+        left != 0, WALL_TABLE[room_styles.wall[left], sides], outer_codes
+    )
+    right_codes = np.where(
+        right != 0, WALL_TABLE[room_styles.wall[right], sides], outer_codes
+    )
+    two_sided = (mono == 0) & ((left != 0) | (right != 0))
+    codes = np.where(mono != 0, mono_codes, outer_codes)
+    codes[two_sided] = _adjoin_many(
+        left_codes[two_sided], right_codes[two_sided]
+    )
+    keep = (mono != 0) | two_sided | (ys > 0)
+    painted[xs[keep], ys[keep]] = tile_types.walls(codes[keep])
 
 
 
-def generate_dungeon(
+def paint_dungeon(
     base_map: maze.basemap.BaseMap,
-    engine: Engine,
-    floor: int,
-) -> GameMap:
-    """Generate a new dungeon map."""
-    player = engine.player
-
-    rng = engine.rng
-    map_shape = base_map.shape
-    dungeon = GameMap(engine, map_shape, entities=[player])
-
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Paint the floors, doors, and walls of a new dungeon map."""
     room_styles = style_rooms(base_map, rng=rng)
+    # Paint into a plain array, which the map takes in chunks. The painters
+    # work on the whole base map at once, so this is the one full-size array
+    # of tiles a floor needs while it is generated.
+    painted = np.full(
+        base_map.shape, tile_types.DEFAULT, dtype=tile_types.tile_dt
+    )
     room_grid = paint_floors(
         base_map=base_map,
-        dungeon=dungeon,
+        painted=painted,
         room_styles=room_styles,
         rng=rng
     )
     paint_doors(
         base_map=base_map,
         room_grid=room_grid,
-        dungeon=dungeon,
+        painted=painted,
         room_styles=room_styles,
         rng=rng
     )
     paint_walls(
         base_map=base_map,
         room_grid=room_grid,
-        dungeon=dungeon,
+        painted=painted,
         room_styles=room_styles,
         rng=rng
     )
+    return painted
+
+
+def paint_symbolic(
+    base_map: maze.basemap.BaseMap,
+    rng: np.random.Generator,
+) -> Tuple[np.ndarray, List[graphics.Recipe], np.random.Generator]:
+    """
+    Paint a dungeon map without touching the tileset, as a worker process
+    must, or so it can be saved.
+    Returns the painted tiles, whose glyphs may be placeholders for the
+    returned recipes, and the generator, which `generate_dungeon` must go on
+    to use so the map comes out as if it had been painted there.
+    """
+    with graphics.recording() as recipes:
+        painted = paint_dungeon(base_map, rng)
+    return painted, recipes, rng
+
+
+def generate_dungeon(
+    base_map: maze.basemap.BaseMap,
+    engine: Engine,
+    floor: int,
+    rng: np.random.Generator,
+    painted: Optional[Tuple[np.ndarray, List[graphics.Recipe]]] = None,
+    palette: Optional[TilePalette] = None,
+) -> GameMap:
+    """
+    Generate a new dungeon map. If it has already been painted by
+    `paint_symbolic`, pass in its tiles and recipes, and the generator it
+    returned. The map's tiles go in `palette`, if given, so the floors of a
+    world can share one.
+    """
+    player = engine.player
+
+    map_shape = base_map.shape
+    dungeon = GameMap(engine, map_shape, palette=palette)
+    if not painted:
+        # Record the glyphs the map needs, so they get made in one batch.
+        tiles, recipes, rng = paint_symbolic(base_map, rng)
+        painted = (tiles, recipes)
+    tiles, recipes = painted
+    # The palette retains the glyphs as it takes the tiles.
+    with graphics.holding():
+        for layer in ("light", "dark"):
+            tiles[layer]["ch"] = graphics.resolve(recipes, tiles[layer]["ch"])
+        dungeon.set_tiles(tiles)
 
     # Get only the non-corridor rooms.
     rooms = [r for r in base_map.rooms if not r.is_corridor()]
@@ -384,6 +520,9 @@ def generate_dungeon(
     dungeon.entry_location = base_map.entry
     dungeon.exit_location = base_map.exit
     # Populate each room with appropriate entities.
-    populate_rooms(dungeon, rooms, floor=floor, rng=rng)
+    populate_rooms(dungeon, base_map, rooms, floor=floor, rng=rng)
+    # Add the player last, so wherever they happen to be standing while we
+    # generate this floor cannot affect where anything else gets placed.
+    dungeon.entities.add(player)
 
     return dungeon
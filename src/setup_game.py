@@ -1,7 +1,6 @@
 """Handle the loading and initialization of game sessions."""
 from __future__ import annotations
 
-import copy
 import lzma
 import pickle
 import traceback
@@ -23,21 +22,30 @@ import input_handlers
 background_image = tcod.image.load("assets/menu_background.png")[:, :, :3]
 
 
-def new_game() -> Engine:
-    """Return a brand new game session as an Engine instance."""
+def new_game(
+    seed: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+) -> Engine:
+    """
+    Return a brand new game session as an Engine instance.
+    The same seed always produces the same game. If `cache_dir` is given,
+    the generated tower is saved there, or loaded if it was saved before.
+    """
     map_shape = 50, 50
     tower_floors = 10
-    # TODO: provide seed as an argument so the same game can be replayed
-    seed = np.int64(time.time_ns())
+    if seed is None:
+        seed = np.int64(time.time_ns())
     rng = np.random.default_rng(seed)
 
-    player = copy.deepcopy(entity_factories.player)
+    player = entity_factories.player.clone()
 
     engine = Engine(player=player, rng=rng)
     engine.game_world = GameWorld(
         engine=engine,
         tower_floors=tower_floors,
         map_shape=map_shape,
+        seed=seed,
+        cache_dir=cache_dir,
     )
     engine.game_world.go_to_starting_level()
     engine.update_fov()
@@ -47,12 +55,12 @@ def new_game() -> Engine:
     )
 
     # Give the player armor and a weapon to start out with.
-    leather_armor = copy.deepcopy(entity_factories.leather_armor)
+    leather_armor = entity_factories.leather_armor.clone()
     leather_armor.parent = player.inventory
     player.inventory.items.append(leather_armor)
     player.equipment.toggle_equip(leather_armor, add_message=False)
 
-    dagger = copy.deepcopy(entity_factories.dagger)
+    dagger = entity_factories.dagger.clone()
     dagger.parent = player.inventory
     player.inventory.items.append(dagger)
     player.equipment.toggle_equip(dagger, add_message=False)
@@ -0,0 +1,124 @@
+"""
+The distinct tiles used in a game, so maps can store a small index for each
+of their tiles instead of the whole tile.
+
+Every floor of the tower shares the world's palette. A map which needs a
+property of a region of tiles, like which are walkable, looks the property
+up for each index in an array holding that property of every palette entry.
+
+A palette is a user of every glyph its tiles show, so those glyphs stay in
+the tileset for as long as the palette exists; see `graphics.retain`. It
+pickles the glyphs made while the game ran as their recipes, since their
+codepoints only mean anything in this session.
+"""
+import threading
+import weakref
+from typing import Dict, List
+
+import numpy as np  # type: ignore
+
+import graphics
+import tile_types
+
+index_dt = np.dtype(np.uint16)
+
+
+class TilePalette:
+    """Tiles numbered in order of first use; tile 0 is `tile_types.DEFAULT`."""
+    _tiles: np.ndarray
+    _indexes: Dict[bytes, int]
+    _layers: Dict[str, np.ndarray]
+    _glyphs: List[int]
+
+    def __init__(self):
+        self._tiles = np.array([tile_types.DEFAULT], dtype=tile_types.tile_dt)
+        self._indexes = {self._tiles[0].tobytes(): 0}
+        self._layers = {}
+        self._lock = threading.Lock()
+        self._retain_glyphs([])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("_lock", "_indexes", "_glyphs"):
+            del state[name]
+        state["_layers"] = {}
+        tiles = self._tiles.copy()
+        chars, state["_recipes"] = graphics.describe(
+            np.stack((tiles["light"]["ch"], tiles["dark"]["ch"]))
+        )
+        tiles["light"]["ch"], tiles["dark"]["ch"] = chars
+        state["_tiles"] = tiles
+        return state
+
+    def __setstate__(self, state):
+        recipes = state.pop("_recipes")
+        tiles = state["_tiles"]
+        with graphics.holding():
+            for layer in ("light", "dark"):
+                tiles[layer]["ch"] = graphics.resolve(recipes, tiles[layer]["ch"])
+            self.__dict__.update(state)
+            self._indexes = {tile.tobytes(): i for i, tile in enumerate(tiles)}
+            self._lock = threading.Lock()
+            self._retain_glyphs(self._chars(tiles))
+
+    @staticmethod
+    def _chars(tiles: np.ndarray) -> List[int]:
+        return tiles["light"]["ch"].tolist() + tiles["dark"]["ch"].tolist()
+
+    def _retain_glyphs(self, glyphs: List[int]):
+        # Release the glyphs once the palette is gone. The finalizer shares
+        # the list, so it sees glyphs added later.
+        self._glyphs = glyphs
+        graphics.retain(glyphs)
+        weakref.finalize(self, graphics.release, glyphs)
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def add(self, tiles: np.ndarray) -> np.ndarray:
+        """Return the index of each of these tiles, adding any new ones."""
+        tiles = np.asarray(tiles, dtype=tile_types.tile_dt)
+        raw = np.ascontiguousarray(tiles).reshape(-1)
+        distinct, inverse = np.unique(
+            raw.view((np.void, raw.dtype.itemsize)), return_inverse=True
+        )
+        with self._lock:
+            new = [
+                key.tobytes() for key in distinct
+                if key.tobytes() not in self._indexes
+            ]
+            if new:
+                if len(self._tiles) + len(new) > np.iinfo(index_dt).max + 1:
+                    raise OverflowError(
+                        f"a palette holds at most {np.iinfo(index_dt).max + 1}"
+                        f" tiles; adding {len(new)} to {len(self._tiles)}"
+                    )
+                for key in new:
+                    self._indexes[key] = len(self._indexes)
+                added = np.frombuffer(b"".join(new), dtype=tile_types.tile_dt)
+                glyphs = self._chars(added)
+                graphics.retain(glyphs)
+                self._glyphs.extend(glyphs)
+                # Replace the arrays, rather than changing them, so readers
+                # on other threads always see a consistent palette.
+                self._tiles = np.concatenate((self._tiles, added))
+                self._layers = {}
+            codes = np.array(
+                [self._indexes[key.tobytes()] for key in distinct],
+                dtype=index_dt,
+            )
+        return codes[inverse].reshape(tiles.shape)
+
+    def lookup(self, indexes: np.ndarray) -> np.ndarray:
+        """Return the tiles for an array of indexes."""
+        return self._tiles.take(indexes)
+
+    def layer(self, name: str) -> np.ndarray:
+        """
+        Return one field of every tile in the palette, such as "walkable" or
+        "light", as a contiguous array which can be indexed by tile index.
+        """
+        layers = self._layers
+        if name not in layers:
+            layers[name] = np.ascontiguousarray(self._tiles[name])
+        return layers[name]
@@ -61,6 +61,25 @@ def floor(char_id):
         light=(char_id, color.white, color.black),
     )
 
+def _many(tile: np.ndarray, char_ids: np.ndarray) -> np.ndarray:
+    # Copies of this tile, but drawn with each of these characters.
+    tiles = np.full(np.shape(char_ids), fill_value=tile, dtype=tile_dt)
+    tiles["dark"]["ch"] = char_ids
+    tiles["light"]["ch"] = char_ids
+    return tiles
+
+def walls(char_ids: np.ndarray) -> np.ndarray:
+    """Array version of `wall`."""
+    return _many(wall(0), char_ids)
+
+def doors(char_ids: np.ndarray) -> np.ndarray:
+    """Array version of `door`."""
+    return _many(door(0), char_ids)
+
+def floors(char_ids: np.ndarray) -> np.ndarray:
+    """Array version of `floor`."""
+    return _many(floor(0), char_ids)
+
 # Shroud represents tiles which have not yet been explored
 SHROUD = np.array((ord(" "), color.white, color.black), dtype=graphic_dt)
 
@@ -0,0 +1,185 @@
+"""
+Save generated towers on disk, so starting a game from a seed we have seen
+before can skip generating it again.
+
+A cache entry is a directory named for everything which determines the
+tower: the seed, the map shape, the number of floors, the grid box size, and
+`GENERATOR_VERSION`, which must change whenever a change to the generator
+would produce a different tower from the same seed. It holds one file with
+the floor plans of the whole tower, plus one file for each floor which has
+been painted, all in numpy's compressed archive format.
+
+Painted floors are stored with glyph recipes rather than codepoints, since
+codepoints are handed out in whatever order the running game needs them; see
+`graphics.recording`. Each floor's tiles are stored as a palette of distinct
+tiles and a map of indexes into that palette.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import graphics
+from maze.basemap import BaseMap
+import tile_types
+
+GENERATOR_VERSION = 1
+
+_RECIPE_OPS = ["composite", "adjoin"]
+
+
+def _save_rng(rng: np.random.Generator) -> str:
+    # The seed sequence goes too, so that `spawn` on the loaded generator
+    # hands out the same children as it would have on the original.
+    seed_seq = rng.bit_generator.seed_seq
+    entropy = seed_seq.entropy
+    if isinstance(entropy, np.ndarray):
+        entropy = entropy.tolist()
+    return json.dumps({
+        "state": rng.bit_generator.state,
+        "seed_seq": {
+            "entropy": entropy,
+            "spawn_key": list(seed_seq.spawn_key),
+            "pool_size": seed_seq.pool_size,
+            "n_children_spawned": seed_seq.n_children_spawned,
+        },
+    })
+
+
+def _load_rng(saved) -> np.random.Generator:
+    saved: Dict[str, Any] = json.loads(str(saved))
+    state = saved["state"]
+    seed_seq = np.random.SeedSequence(
+        saved["seed_seq"]["entropy"],
+        spawn_key=tuple(saved["seed_seq"]["spawn_key"]),
+        pool_size=saved["seed_seq"]["pool_size"],
+        n_children_spawned=saved["seed_seq"]["n_children_spawned"],
+    )
+    bit_generator = getattr(np.random, state["bit_generator"])(seed_seq)
+    bit_generator.state = state
+    return np.random.Generator(bit_generator)
+
+
+def _save(path: str, arrays: Dict[str, np.ndarray]):
+    # Write to a temporary file first, so a reader never sees half a file.
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(temp, path)
+
+
+class TowerCache:
+    """The cache entry for one particular tower."""
+    path: str
+
+    def __init__(
+        self,
+        root: str,
+        *,
+        seed: int,
+        map_shape: Tuple[int, int],
+        tower_floors: int,
+        box_size: int,
+    ):
+        key = repr((
+            int(seed),
+            tuple(int(n) for n in map_shape),
+            int(tower_floors),
+            int(box_size),
+            GENERATOR_VERSION,
+        ))
+        digest = hashlib.sha256(key.encode()).hexdigest()[:24]
+        self.path = os.path.join(root, digest)
+
+    def _tower_path(self) -> str:
+        return os.path.join(self.path, "tower.npz")
+
+    def _floor_path(self, index: int) -> str:
+        return os.path.join(self.path, f"floor{index}.npz")
+
+    def load_tower(
+        self
+    ) -> Optional[Tuple[List[BaseMap], np.random.Generator, List[np.random.Generator]]]:
+        """
+        Return the floor plans, the state of the game's generator after
+        making them, and each floor's own generator, or None if the tower
+        has not been saved.
+        """
+        if not os.path.exists(self._tower_path()):
+            return None
+        with np.load(self._tower_path()) as archive:
+            floors = int(archive["floors"])
+            base_tower = []
+            for i in range(floors):
+                prefix = f"{i}."
+                base_tower.append(BaseMap.from_arrays({
+                    name[len(prefix):]: archive[name]
+                    for name in archive.files if name.startswith(prefix)
+                }))
+            rng = _load_rng(archive["rng"])
+            floor_rngs = [_load_rng(s) for s in archive["floor_rngs"]]
+        return base_tower, rng, floor_rngs
+
+    def save_tower(
+        self,
+        base_tower: List[BaseMap],
+        rng: np.random.Generator,
+        floor_rngs: List[np.random.Generator],
+    ):
+        os.makedirs(self.path, exist_ok=True)
+        arrays = {
+            "floors": np.array(len(base_tower)),
+            "rng": np.array(_save_rng(rng)),
+            "floor_rngs": np.array([_save_rng(r) for r in floor_rngs]),
+        }
+        for i, base_map in enumerate(base_tower):
+            for name, array in base_map.to_arrays().items():
+                arrays[f"{i}.{name}"] = array
+        _save(self._tower_path(), arrays)
+
+    def has_floor(self, index: int) -> bool:
+        return os.path.exists(self._floor_path(index))
+
+    def load_floor(
+        self, index: int
+    ) -> Optional[Tuple[np.ndarray, List[graphics.Recipe], np.random.Generator]]:
+        """
+        Return what `procgen.paint_symbolic` returned for this floor, or None
+        if it has not been saved.
+        """
+        if not self.has_floor(index):
+            return None
+        with np.load(self._floor_path(index)) as archive:
+            palette = archive["palette"].view(tile_types.tile_dt).reshape(-1)
+            tiles = np.asfortranarray(palette[archive["index"]])
+            recipes = [
+                (_RECIPE_OPS[op], a, b)
+                for op, a, b in archive["recipes"].tolist()
+            ]
+            rng = _load_rng(archive["rng"])
+        return tiles, recipes, rng
+
+    def save_floor(
+        self,
+        index: int,
+        tiles: np.ndarray,
+        recipes: List[graphics.Recipe],
+        rng: np.random.Generator,
+    ):
+        # Most maps use a few hundred distinct tiles at most.
+        raw = np.ascontiguousarray(tiles).view((np.void, tiles.dtype.itemsize))
+        palette, inverse = np.unique(raw.reshape(-1), return_inverse=True)
+        index_dt = np.uint16 if len(palette) <= 0x10000 else np.uint32
+        recipe_array = np.array(
+            [(_RECIPE_OPS.index(op), a, b) for op, a, b in recipes],
+            dtype=np.int32,
+        ).reshape(-1, 3)
+        os.makedirs(self.path, exist_ok=True)
+        _save(self._floor_path(index), {
+            "palette": palette.view(np.uint8).reshape(len(palette), -1),
+            "index": inverse.reshape(tiles.shape).astype(index_dt),
+            "recipes": recipe_array,
+            "rng": np.array(_save_rng(rng)),
+        })
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The game's modules import each other from the src directory, and some from
+# the repository root, as when run by run.sh; assets load relative to the root.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+os.chdir(ROOT)
+
+
+@pytest.fixture(scope="session")
+def tileset():
+    """The game's tileset, with all its graphics loaded."""
+    import main
+    return main.load_tiles()
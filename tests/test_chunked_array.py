@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from chunked_array import ChunkedArray
+
+
+def test_windows_match_a_dense_array():
+    rng = np.random.default_rng(0)
+    dense = np.zeros((50, 37), dtype=np.int16)
+    array = ChunkedArray(dense.shape, fill_value=0, dtype=np.int16, chunk_size=8)
+    for _ in range(40):
+        left, right = sorted(rng.integers(0, 51, size=2))
+        top, bottom = sorted(rng.integers(0, 38, size=2))
+        value = rng.integers(0, 3, size=(right - left, bottom - top))
+        dense[left:right, top:bottom] = value
+        array[left:right, top:bottom] = value
+    np.testing.assert_array_equal(np.asarray(array), dense)
+    np.testing.assert_array_equal(array[3:45, 10:30], dense[3:45, 10:30])
+    assert array[49, 36] == dense[49, 36]
+    assert array[-1, -1] == dense[-1, -1]
+
+
+def test_unwritten_chunks_share_one_read_only_blank():
+    array = ChunkedArray((64, 64), fill_value=7, dtype=np.uint8, chunk_size=16)
+    other = ChunkedArray((32, 32), fill_value=7, dtype=np.uint8, chunk_size=16)
+    assert array.nbytes == 0
+    assert array[5, 5] == 7
+    assert array._blank() is other._blank()
+    assert not array._blank().flags.writeable
+    # Reading never allocates, nor does writing the fill value.
+    np.testing.assert_array_equal(array[:, :], np.full((64, 64), 7))
+    array[0:20, 0:20] = 7
+    array[40, 40] = 7
+    assert array.nbytes == 0
+    assert list(array.resident()) == []
+
+
+def test_writing_allocates_only_touched_chunks_and_frees_them_again():
+    array = ChunkedArray((64, 64), fill_value=0, dtype=np.uint8, chunk_size=16)
+    array[17, 40] = 1
+    assert list(array.resident()) == [(1, 2)]
+    assert array.nbytes == 16 * 16
+    # The shared blank chunk is untouched by the write.
+    assert array._blank().max() == 0
+    array[10:20, 10:20] = 2
+    assert sorted(array.resident()) == [(0, 0), (0, 1), (1, 0), (1, 1), (1, 2)]
+    array[0:32, 0:32] = 0
+    assert list(array.resident()) == [(1, 2)]
+    array[17:18, 40:41] = 0
+    assert array.nbytes == 0
+
+
+def test_strided_slices_are_refused():
+    array = ChunkedArray((8, 8), fill_value=0)
+    with pytest.raises(IndexError):
+        array[::2, :]
+    with pytest.raises(IndexError):
+        array[8, 0]
@@ -0,0 +1,108 @@
+import enum
+
+import pytest
+
+import entity_factories
+from components.ai import ConfusedEnemy
+from components.appearance import Default, Directional, Looped, Static
+from entity import Entity
+
+PROTOTYPES = {
+    name: value for name, value in vars(entity_factories).items()
+    if isinstance(value, Entity)
+}
+
+# Values which never change, and so may be shared between entities.
+IMMUTABLE = (str, bytes, int, float, bool, type(None), enum.Enum, Static, Default)
+
+
+def mutable_parts(obj, found=None):
+    """Every mutable object reachable from this one, by id."""
+    if found is None:
+        found = {}
+    if isinstance(obj, IMMUTABLE) or callable(obj) or id(obj) in found:
+        return found
+    if not isinstance(obj, tuple):
+        found[id(obj)] = obj
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            mutable_parts(key, found)
+            mutable_parts(value, found)
+    elif isinstance(obj, (list, tuple, set)):
+        for value in obj:
+            mutable_parts(value, found)
+    elif hasattr(obj, "__dict__"):
+        mutable_parts(vars(obj), found)
+    return found
+
+
+@pytest.mark.parametrize("name", sorted(PROTOTYPES))
+def test_clone_shares_no_mutable_state(name):
+    prototype = PROTOTYPES[name]
+    clone = prototype.clone()
+    assert type(clone) is type(prototype)
+    assert not hasattr(clone, "parent")
+    parts = mutable_parts(prototype)
+    assert not [parts[i] for i in parts.keys() & mutable_parts(clone).keys()]
+    # The clone's components belong to it, not to the prototype.
+    for component in ("fighter", "inventory", "level", "equipment",
+                      "consumable", "equippable", "mechanism"):
+        part = getattr(clone, component, None)
+        if part is not None:
+            assert part.parent is clone
+    if getattr(clone, "ai", None) is not None:
+        assert clone.ai.entity is clone
+
+
+def test_playing_with_a_clone_leaves_the_prototype_alone():
+    prototype = entity_factories.orc
+    hp, ai_path = prototype.fighter.hp, list(prototype.ai.path)
+    clone = prototype.clone()
+    clone.move(-1, 0)
+    clone.appearance.animate()
+    clone.fighter.hp -= 3
+    clone.ai.path.append((1, 2))
+    assert prototype.fighter.hp == hp
+    assert prototype.ai.path == ai_path
+    assert clone.clone().ai.path == [(1, 2)]
+
+
+def test_clone_equips_its_own_inventory():
+    player = entity_factories.player.clone()
+    dagger = entity_factories.dagger.clone()
+    dagger.parent = player.inventory
+    player.inventory.items.append(dagger)
+    player.equipment.toggle_equip(dagger, add_message=False)
+
+    clone = player.clone()
+    (item,) = clone.inventory.items
+    assert item is not dagger
+    assert item.parent is clone.inventory
+    assert clone.equipment.weapon is item
+    assert item.equippable.parent is item
+    assert clone.fighter.power == player.fighter.power
+
+
+def test_confused_clone_recovers_to_its_own_ai():
+    orc = entity_factories.orc.clone()
+    orc.ai = ConfusedEnemy(orc, orc.ai, 3)
+    clone = orc.clone()
+    assert clone.ai is not orc.ai
+    assert clone.ai.previous_ai is not orc.ai.previous_ai
+    assert clone.ai.previous_ai.entity is clone
+
+
+def test_animated_appearances_are_copied_in_step():
+    still = Static("x")
+    directional = Directional(Static("<"), Static(">"))
+    directional.move(1, 0)
+    looped = Looped([directional, still])
+    looped.animate()
+
+    clone = looped.clone()
+    assert clone.pos == 1 and clone.render() == looped.render()
+    assert clone.loop[0] is not directional and clone.loop[1] is still
+    assert clone.loop[0].current is clone.loop[0].right
+    clone.animate()
+    clone.move(-1, 0)
+    assert looped.pos == 1 and directional.current is directional.right
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import entity_factories
+import tile_types
+from engine import Engine
+from floor_store import FloorStore, footprint
+from game_map import GameMap
+from tile_palette import TilePalette
+
+SHAPE = (128, 96)
+
+
+@pytest.fixture
+def engine():
+    return Engine(
+        player=entity_factories.player.clone(),
+        rng=np.random.default_rng(0),
+    )
+
+
+@pytest.fixture
+def palette():
+    return TilePalette()
+
+
+def make_floor(engine, palette, index):
+    """A map with a room and a potion in a place peculiar to its floor."""
+    game_map = GameMap(engine, SHAPE, palette=palette)
+    tiles = np.full(SHAPE, tile_types.DEFAULT, dtype=tile_types.tile_dt)
+    tiles[10 + index:60, 5:40 + index] = tile_types.floor(ord("."))
+    game_map.set_tiles(tiles)
+    game_map.explored[10:20 + index, 5:15] = True
+    entity_factories.health_potion.spawn(game_map, 11 + index, 6)
+    return game_map
+
+
+def snapshot(game_map):
+    return (
+        game_map.palette.lookup(np.asarray(game_map.tiles)).tobytes(),
+        np.asarray(game_map.explored).tobytes(),
+        sorted((e.name, e.x, e.y) for e in game_map.entities),
+    )
+
+
+def fill(engine, palette, floors, budget):
+    store = FloorStore(engine, budget=budget, palette=palette)
+    maps = [make_floor(engine, palette, i) for i in range(floors)]
+    engine.player.place(30, 20, maps[0])
+    snapshots = [snapshot(m) for m in maps]
+    for i, game_map in enumerate(maps):
+        store.put(i, game_map)
+    return store, maps, snapshots
+
+
+def cold(store):
+    return sorted(store._cold)
+
+
+def test_least_recently_used_floors_are_compressed(engine, palette):
+    size = footprint(make_floor(engine, palette, 0))
+    # Room for two floors beyond the current one and its neighbor.
+    store, maps, _ = fill(engine, palette, 6, budget=2 * size)
+    assert cold(store) == [2, 3]
+    assert store.has(2) and not store.has(6)
+    assert store.get(6) is None
+    # Using a cold floor unpacks it, making it the most recently used.
+    store.get(2)
+    assert cold(store) == [3]
+    # Moving unpacks the floors around the player's, then compresses the
+    # least recently used of the rest until they fit.
+    store.visit(4)
+    assert cold(store) == [0]
+    assert store.stats()["evictions"] == 3
+    assert store.stats()["restores"] == 2
+
+
+def test_floors_near_the_player_are_never_compressed(engine, palette):
+    store, maps, _ = fill(engine, palette, 5, budget=0)
+    assert cold(store) == [2, 3, 4]
+    store.visit(3)
+    assert cold(store) == [0, 1]
+    assert store.get(3) is not None and 3 not in store._cold
+
+
+def test_restored_floors_match_and_share_the_game(engine, palette):
+    store, maps, snapshots = fill(engine, palette, 5, budget=0)
+    stats = store.stats()
+    assert stats["cold_floors"] == 3
+    # Compressed floors take much less room than they did in memory.
+    assert stats["cold_bytes"] < footprint(maps[2]) * 3 / 4
+    store.visit(4)
+    assert 0 in store._cold
+    for i in range(5):
+        game_map = store.get(i)
+        assert snapshot(game_map) == snapshots[i]
+        # The engine, the palette and the player are shared, not copied.
+        assert game_map.engine is engine
+        assert game_map.palette is palette
+    restored = store.get(0)
+    assert restored is not maps[0]
+    assert engine.player in restored.entities
+    for entity in restored.entities - {engine.player}:
+        assert entity.parent is restored
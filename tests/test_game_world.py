@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from engine import Engine
+import entity_factories
+from game_world import GameWorld
+import setup_game
+import tile_types
+
+
+def new_game(seed, paint_processes=0):
+    """A game from this seed, set up as `setup_game.new_game` does."""
+    engine = Engine(
+        player=entity_factories.player.clone(),
+        rng=np.random.default_rng(seed),
+    )
+    engine.game_world = GameWorld(
+        engine=engine, map_shape=(50, 50), tower_floors=10,
+        paint_processes=paint_processes,
+    )
+    engine.game_world.go_to_starting_level()
+    return engine
+
+
+def floors(engine):
+    """What each floor of the tower looks like, as plain data."""
+    world = engine.game_world
+    out = []
+    for i in range(world.tower_floors):
+        game_map = world.floor(i)
+        entities = sorted(
+            (e.name, e.x, e.y) for e in game_map.entities
+            if e is not engine.player
+        )
+        tiles = game_map.palette.lookup(np.asarray(game_map.tiles))
+        out.append((tiles.tobytes(), entities))
+    return out
+
+
+def looks(tileset, engine):
+    """Like `floors`, but with each glyph's image in place of its codepoint,
+    which depends on the order glyphs were made in."""
+    out = []
+    for tiles, entities in floors(engine):
+        tiles = np.frombuffer(tiles, dtype=tile_types.tile_dt)
+        images = [
+            tileset.get_tile(int(code)).tobytes()
+            for code in np.concatenate([tiles["dark"]["ch"], tiles["light"]["ch"]])
+        ]
+        out.append((tiles[["walkable", "transparent"]].tobytes(), images, entities))
+    return out
+
+
+@pytest.mark.parametrize("seed", [3, 4, 5])
+def test_saving_while_generating_keeps_the_tower_deterministic(
+    tileset, tmp_path, seed
+):
+    expected = floors(new_game(seed))
+    # Save straight away, while the background worker is generating floors.
+    engine = new_game(seed)
+    engine.save_as(str(tmp_path / "savegame.sav"))
+    loaded = setup_game.load_game(str(tmp_path / "savegame.sav"))
+    assert floors(loaded) == expected
+    assert floors(engine) == expected
+
+
+def test_painting_in_processes_matches_painting_here(tileset):
+    expected = looks(tileset, new_game(6))
+    assert looks(tileset, new_game(6, paint_processes=2)) == expected
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import graphics
+
+
+@pytest.fixture
+def small_registry(tileset, monkeypatch):
+    # Fill a tiny registry, so making more glyphs has to evict some.
+    monkeypatch.setattr(graphics, "GLYPH_LIMIT", 8)
+    return tileset
+
+
+def assert_registered(codes):
+    for code in codes:
+        assert code in graphics._recipe_of
+        assert code not in graphics._free
+
+
+def test_composite_codes_stay_registered_when_over_limit(small_registry):
+    floors = graphics.FLOOR_STONE[0].codes.tolist()
+    actors = [graphics.player.render()[0], graphics.POTION, graphics.SCROLL]
+    for above in actors:
+        codes = [graphics.composite(below, above) for below in floors]
+        assert_registered(codes[-1:])
+        many = graphics.composite_many(np.array(floors), above).tolist()
+        assert_registered(many)
+        assert len(set(many)) == len(many)
+
+
+def test_returned_codes_stay_registered_when_all_in_use(small_registry):
+    # With every glyph in use, the registry overflows its limit rather than
+    # evicting the glyphs it is returning.
+    floors = graphics.FLOOR_WOOD[0].codes.tolist()
+    held = []
+    try:
+        for above in (graphics.DOOR_H, graphics.DOOR_V):
+            codes = graphics.composite_many(np.array(floors), above).tolist()
+            assert_registered(codes)
+            graphics.retain(codes)
+            held += codes
+        assert_registered(held)
+    finally:
+        graphics.release(held)
+
+
+def test_reused_glyphs_survive_eviction(small_registry):
+    # Glyphs asked for again in a batch which must evict are kept.
+    walls = graphics.WALL_ROCK[0].codes.tolist()
+    first = graphics.synthesize([("adjoin", w, walls[0]) for w in walls[:4]])
+    recipes = [("adjoin", w, walls[0]) for w in walls[:4]]
+    recipes += [("adjoin", w, walls[1]) for w in walls[:6]]
+    codes = graphics.synthesize(recipes)
+    assert_registered(codes)
+    assert codes[:4] == first
+
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import maze.create
+from maze.basemap import Tile
+
+SEED = np.int64(12345)
+BIG = (-100, -60, 120, 90)
+
+
+@pytest.fixture(scope="module")
+def big():
+    return maze.create.region(BIG, SEED)
+
+
+def windows(count, seed):
+    """Random windows inside the big one, of all shapes, many overlapping."""
+    rng = np.random.default_rng(seed)
+    big_left, big_top, big_right, big_bottom = BIG
+    for _ in range(count):
+        left = int(rng.integers(big_left, big_right - 1))
+        top = int(rng.integers(big_top, big_bottom - 1))
+        right = min(left + int(rng.integers(1, 60)), big_right)
+        bottom = min(top + int(rng.integers(1, 50)), big_bottom)
+        yield left, top, right, bottom
+
+
+@pytest.mark.parametrize("window", list(windows(30, seed=0)))
+def test_windows_agree_tile_for_tile(big, window):
+    big_map, big_cells = big
+    left, top, right, bottom = window
+    part, cells = maze.create.region(window, SEED)
+    x0, y0 = left - BIG[0], top - BIG[1]
+    x1, y1 = right - BIG[0], bottom - BIG[1]
+    np.testing.assert_array_equal(part.tiles, big_map.tiles[x0:x1, y0:y1])
+    # Each floor tile belongs to the same offgrid cell in both maps.
+    floor = part.tiles == Tile.FLOOR
+    np.testing.assert_array_equal(
+        cells[part.room_labels.labels[floor]],
+        big_cells[big_map.room_labels.labels[x0:x1, y0:y1][floor]],
+    )
+
+
+def test_overlapping_windows_agree_where_they_overlap():
+    a, _ = maze.create.region((0, 0, 70, 50), SEED)
+    b, _ = maze.create.region((40, 30, 110, 80), SEED)
+    np.testing.assert_array_equal(a.tiles[40:70, 30:50], b.tiles[0:30, 0:20])
+
+
+def test_seeds_differ():
+    a, _ = maze.create.region((0, 0, 60, 40), SEED)
+    b, _ = maze.create.region((0, 0, 60, 40), SEED + 1)
+    assert not np.array_equal(a.tiles, b.tiles)
+
+
+def test_doors_open_between_rooms(big):
+    big_map, _ = big
+    assert big_map.doorways
+    tiles = big_map.tiles
+    for wall in big_map.doorways:
+        x, y = wall.doorway
+        assert tiles[x, y] in (Tile.DOOR, Tile.FLOOR)
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+import entity_factories
+import maze.create
+import procgen
+import setup_game
+from game_map import GameMap
+from maze.basemap import Tile
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3, 4])
+def test_lair_on_the_ground_floor_measures_from_the_door(seed):
+    # A one-floor tower's lair is entered by the door outside, which stands
+    # in the perimeter wall rather than in any room.
+    (lair,) = maze.create.tower(
+        shape=(60, 40), stories=np.uint(1), rng=np.random.default_rng(seed)
+    )
+    x, y = lair.entry
+    assert lair.tiles[x, y] == Tile.WALL
+    room_id = procgen.entry_room_id(lair, x, y)
+    (room,) = [room for room in lair.rooms if room.id == room_id]
+    assert any(
+        room.contains(nx, ny)
+        for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1))
+    )
+    distances = lair.room_distances(room_id)
+    assert distances[room_id] == 0
+    assert all(distances[room.id] >= 0 for room in lair.rooms)
+
+
+def test_stairs_stand_in_the_room_they_enter():
+    ground, lair = maze.create.tower(
+        shape=(60, 40), stories=np.uint(2), rng=np.random.default_rng(5)
+    )
+    x, y = lair.entry
+    assert procgen.entry_room_id(lair, x, y) == lair.room_labels.labels[x, y]
+
+
+def weights_for(chances, floor):
+    weights = {}
+    for key, values in chances.items():
+        if key > floor:
+            break
+        weights.update(values)
+    return weights
+
+
+def implied_probabilities(table):
+    """The chance of choosing each entity, read straight off the table."""
+    n = len(table.entities)
+    chances = table.keep / n
+    np.add.at(chances, table.alias, (1 - table.keep) / n)
+    return chances
+
+
+@pytest.mark.parametrize("floor", range(1, 11))
+def test_spawn_tables_match_their_weights(floor):
+    for table, chances in zip(
+        procgen.spawn_tables(floor),
+        (procgen.enemy_chances, procgen.item_chances),
+    ):
+        weights = weights_for(chances, floor)
+        assert table.entities == list(weights)
+        expected = np.array(list(weights.values()), dtype=float)
+        expected /= expected.sum()
+        np.testing.assert_allclose(
+            implied_probabilities(table), expected, atol=1e-12
+        )
+        # Evenly spread samples choose each entity in proportion too.
+        samples = (np.arange(100_000) + 0.5) / 100_000
+        counts = np.bincount(table.choose(samples), minlength=len(expected))
+        np.testing.assert_allclose(counts / len(samples), expected, atol=1e-4)
+
+
+def test_spawn_table_never_chooses_unweighted_entities():
+    table = procgen.SpawnTable.compile(
+        {0: [("a", 3), ("b", 0), ("c", 1)], 2: [("c", 0)]}, floor=2
+    )
+    assert table.entities == ["a", "b", "c"]
+    chosen = table.choose(np.random.default_rng(0).random(10_000))
+    assert set(chosen.tolist()) == {0}
+    # Samples at the very edges of [0, 1) still land on a column.
+    assert table.choose(np.array([0.0, np.nextafter(1.0, 0)])).tolist() == [0, 0]
+
+
+def test_room_populations_stay_within_each_floors_limits():
+    rooms = [None] * 2000
+    for floor in (1, 4, 6):
+        monsters, items = procgen.spawn_tables(floor)
+        max_monsters = procgen.get_max_value_for_floor(
+            procgen.max_monsters_by_floor, floor
+        )
+        max_items = procgen.get_max_value_for_floor(
+            procgen.max_items_by_floor, floor
+        )
+        populations = procgen.choose_entities(
+            rooms, floor, np.random.default_rng(floor)
+        )
+        sizes = set()
+        for population in populations:
+            room_monsters = [e for e in population if e in monsters.entities]
+            room_items = population[len(room_monsters):]
+            assert all(e in items.entities for e in room_items)
+            assert 1 <= len(room_monsters) <= max_monsters
+            assert len(room_items) <= max_items
+            sizes.add((len(room_monsters), len(room_items)))
+        # Every combination of counts turns up.
+        assert len(sizes) == max_monsters * (max_items + 1)
+
+
+@pytest.fixture
+def ground_floor():
+    (base_map,) = maze.create.tower(
+        shape=(50, 50), stories=np.uint(1), rng=np.random.default_rng(6)
+    )
+    return base_map
+
+
+def test_spawn_sites_are_distinct_free_tiles_of_the_room(ground_floor):
+    dungeon = GameMap(None, ground_floor.shape)
+    room = max(ground_floor.rooms, key=lambda room: room.area())
+    tiles = {tuple(t) for t in room.tiles().tolist()}
+    taken = sorted(tiles)[:3]
+    for x, y in taken:
+        entity_factories.health_potion.spawn(dungeon, x, y)
+    sites = procgen.SpawnSites(dungeon)
+    rng = np.random.default_rng(0)
+    drawn = [tuple(t) for t in sites.draw(room, 5, rng).tolist()]
+    # Later draws in the same room never reuse a tile.
+    drawn += [tuple(t) for t in sites.draw(room, 5, rng).tolist()]
+    assert len(drawn) == len(set(drawn)) == 10
+    assert set(drawn) <= tiles - set(taken)
+    assert all(sites.occupied[x, y] for x, y in drawn + taken)
+    # A room runs out of tiles rather than stacking entities.
+    rest = sites.draw(room, len(tiles), rng)
+    assert len(rest) == len(tiles) - len(taken) - 10
+    assert len(sites.draw(room, 1, rng)) == 0
+
+
+def test_generated_floors_never_stack_entities(tileset):
+    engine = setup_game.new_game(seed=21)
+    world = engine.game_world
+    for i in range(world.tower_floors):
+        game_map = world.floor(i)
+        spots = [
+            (e.x, e.y) for e in game_map.entities if e is not engine.player
+        ]
+        assert len(spots) == len(set(spots))
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import tile_types
+from tile_palette import TilePalette, index_dt
+
+
+def floors(count, first=0):
+    """Floor tiles with `count` different glyphs."""
+    return tile_types.floors(np.arange(first, first + count))
+
+
+def test_indexes_look_up_the_tiles_added():
+    palette = TilePalette()
+    tiles = floors(3)[[2, 0, 2, 1]]
+    indexes = palette.add(tiles)
+    assert indexes.dtype == index_dt
+    assert len(palette) == 4 and 0 not in indexes
+    np.testing.assert_array_equal(palette.lookup(indexes), tiles)
+    # Tiles already in the palette keep their indexes.
+    np.testing.assert_array_equal(palette.add(tiles[::-1]), indexes[::-1])
+    assert len(palette) == 4
+
+
+def test_too_many_tiles_overflow_the_index():
+    palette = TilePalette()
+    room = np.iinfo(index_dt).max  # Tile 0 is taken already.
+    palette.add(floors(room - 10))
+    with pytest.raises(OverflowError):
+        palette.add(floors(20, first=room - 10))
+    # The palette is unchanged, and still takes tiles which fit.
+    assert len(palette) == room - 9
+    palette.add(floors(10, first=room - 10))
+    assert len(palette) == room + 1
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+import maze.create
+import procgen
+import setup_game
+from tower_cache import TowerCache
+
+
+def make_cache(root, seed=1, **changes):
+    key = dict(seed=seed, map_shape=(50, 50), tower_floors=2, box_size=8)
+    key.update(changes)
+    return TowerCache(str(root), **key)
+
+
+def test_entries_are_keyed_by_everything_which_shapes_the_tower(tmp_path):
+    paths = {
+        make_cache(tmp_path).path,
+        make_cache(tmp_path, seed=2).path,
+        make_cache(tmp_path, map_shape=(50, 60)).path,
+        make_cache(tmp_path, tower_floors=3).path,
+        make_cache(tmp_path, box_size=9).path,
+    }
+    assert len(paths) == 5
+    assert make_cache(tmp_path).path == make_cache(tmp_path).path
+
+
+def test_tower_round_trip(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.load_tower() is None
+    rng = np.random.default_rng(1)
+    tower = maze.create.tower(shape=(50, 50), stories=np.uint(2), rng=rng)
+    floor_rngs = rng.spawn(len(tower))
+    cache.save_tower(tower, rng, floor_rngs)
+
+    loaded, loaded_rng, loaded_floor_rngs = cache.load_tower()
+    assert len(loaded) == len(tower)
+    for base_map, loaded_map in zip(tower, loaded):
+        expected, actual = base_map.to_arrays(), loaded_map.to_arrays()
+        assert expected.keys() == actual.keys()
+        for name in expected:
+            np.testing.assert_array_equal(actual[name], expected[name])
+        assert loaded_map.entry == base_map.entry
+        assert loaded_map.exit == base_map.exit
+    assert loaded_rng.bit_generator.state == rng.bit_generator.state
+    assert [r.bit_generator.state for r in loaded_floor_rngs] == [
+        r.bit_generator.state for r in floor_rngs
+    ]
+    # Generators spawned from the loaded ones must match as well.
+    for loaded_r, r in zip(
+        [loaded_rng] + loaded_floor_rngs, [rng] + floor_rngs
+    ):
+        np.testing.assert_array_equal(
+            loaded_r.spawn(1)[0].integers(1 << 30, size=4),
+            r.spawn(1)[0].integers(1 << 30, size=4),
+        )
+
+
+def test_floor_round_trip(tmp_path):
+    cache = make_cache(tmp_path)
+    (base_map,) = maze.create.tower(
+        shape=(50, 50), stories=np.uint(1), rng=np.random.default_rng(2)
+    )
+    tiles, recipes, rng = procgen.paint_symbolic(
+        base_map, np.random.default_rng(3)
+    )
+    assert recipes
+    assert not cache.has_floor(0)
+    assert cache.load_floor(0) is None
+    cache.save_floor(0, tiles, recipes, rng)
+
+    assert cache.has_floor(0)
+    loaded_tiles, loaded_recipes, loaded_rng = cache.load_floor(0)
+    np.testing.assert_array_equal(loaded_tiles, tiles)
+    assert loaded_recipes == recipes
+    assert loaded_rng.bit_generator.state == rng.bit_generator.state
+
+
+def tower_images(engine, tileset):
+    """Each floor of the tower, with each glyph as its image."""
+    world = engine.game_world
+    out = []
+    for i in range(world.tower_floors):
+        game_map = world.floor(i)
+        tiles = game_map.palette.lookup(np.asarray(game_map.tiles))
+        codes, inverse = np.unique(tiles["light"]["ch"], return_inverse=True)
+        images = np.array([tileset.get_tile(int(c)) for c in codes])
+        entities = sorted(
+            (e.name, e.x, e.y) for e in game_map.entities
+            if e is not engine.player
+        )
+        out.append((tiles["walkable"], images[inverse.reshape(-1)], entities))
+    return out
+
+
+@pytest.mark.parametrize("seed", [11, 12])
+def test_cached_tower_equals_uncached(tileset, tmp_path, seed):
+    uncached = setup_game.new_game(seed=seed)
+    expected = tower_images(uncached, tileset)
+    expected_spawned = uncached.rng.spawn(1)[0].integers(1 << 30, size=4)
+    # Generating it the first time fills the cache; the second reads it.
+    for attempt in range(2):
+        engine = setup_game.new_game(seed=seed, cache_dir=str(tmp_path))
+        for (walkable, images, entities), (
+            expected_walkable, expected_images, expected_entities
+        ) in zip(tower_images(engine, tileset), expected):
+            np.testing.assert_array_equal(walkable, expected_walkable)
+            np.testing.assert_array_equal(images, expected_images)
+            assert entities == expected_entities
+        assert (engine.player.x, engine.player.y) == (
+            uncached.player.x, uncached.player.y
+        )
+        assert engine.rng.bit_generator.state == uncached.rng.bit_generator.state
+        np.testing.assert_array_equal(
+            engine.rng.spawn(1)[0].integers(1 << 30, size=4), expected_spawned
+        )